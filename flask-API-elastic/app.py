@@ -22,12 +22,27 @@ Concerns:
     finish.
 """
 
+import gzip
+import itertools
 import database as db
-from flask import Flask, render_template, request, jsonify
+from elasticsearch import NotFoundError, RequestError, TransportError
+from flask import Flask, render_template, request, jsonify, url_for, stream_with_context
+from instrumentation import Instrumentation, stage
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+
+# Compression of json responses
+GZIP_MIN_SIZE = 1024  # bytes
+GZIP_LEVEL = 5
+
+# Template chunks rendered before sending them when html pages are streamed
+STREAM_BUFFER_SIZE = 100
+
+CURSOR_NOT_FOUND_MESSAGE = "Data not found in ElasticSearch."
 
 
 app = Flask(__name__)
-es = db.ElasticSearchConnection()
+Instrumentation(app)  # opt-in request timings and metrics (FLASK_INSTRUMENTATION=1)
 
 
 @app.route('/')
@@ -37,20 +52,212 @@ def home():
 
 @app.route('/data/<int:page>')
 def data(page):
-    """API route"""
-    es_columns = db.FIELD_NAMES
-    es_data = db.getData(page, es)
-    if 'application/json' in request.headers['Accept']:
-        return jsonify(es_data)
+    """
+    API route. Use fields=a,b to return only some columns and page_size=n for bigger pages.
+    Html pages bigger than the default page size are streamed.
+    """
+    not_found_message = f"Data not found for index {page} in ElasticSearch. " \
+                        f"Try a different value"
+    try:
+        fields = _get_fields()
+        page_size = _get_page_size()
+    except ValueError as e:
+        return render_template('404.jinja2', message=str(e)), 400
+
+    try:
+        html = 'application/json' not in request.headers.get('Accept', '')
+        if html and page_size > db.PAGE_SIZE:
+            documents = db.iterData(page * page_size, page_size, db.getClient(), fields)
+            return _stream_table(documents, fields, not_found_message)
+        with stage('elasticsearch'):
+            es_data = db.getData(page, db.getClient(), fields, page_size)
+    except RequestError:
+        return render_template(
+            '404.jinja2', message="Page too deep. Use /data to browse it with a cursor"
+        ), 400
+    return _response(es_data, fields, {'page': page}, not_found_message)
+
+
+@app.route('/data')
+def data_cursor():
+    """
+    API route with cursor pagination: /data for the first page, then /data?cursor=...
+    Html pages bigger than the default page size are streamed.
+    The same route is served by an async handler in asgi.py.
+    """
+    try:
+        cursor, fields, page_size = cursor_arguments()
+        if streams_table(page_size):
+            page = {}
+            documents = db.iterDataAfter(cursor, page_size, db.getClient(), fields, page=page)
+            return _stream_table(documents, fields, CURSOR_NOT_FOUND_MESSAGE,
+                                 lambda: _next_cursor_url(page['next_cursor']))
+        with stage('elasticsearch'):
+            es_data = db.getDataAfter(cursor, db.getClient(), fields, page_size)
+    except (ValueError, TransportError) as e:
+        return cursor_error(e)
+    return cursor_response(es_data, fields)
+
+
+def cursor_arguments() -> Tuple[Optional[str], List[str], int]:
+    """ Return the cursor, fields and page size of a /data request. Raise ValueError if they
+    are not valid """
+    return request.args.get('cursor'), _get_fields(), _get_page_size()
+
+
+def streams_table(page_size: int) -> bool:
+    """ Return True if a page is answered with a streamed html table """
+    return 'application/json' not in request.headers.get('Accept', '') and \
+        page_size > db.PAGE_SIZE
+
+
+def cursor_error(error: Exception):
+    """ Return the error page of a /data request. Raise the error again if it is unexpected """
+    if isinstance(error, ValueError):
+        return render_template('404.jinja2', message=str(error)), 400
+    if isinstance(error, NotFoundError):
+        return render_template(
+            '404.jinja2', message="Cursor expired. Start again from /data"
+        ), 404
+    if isinstance(error, TransportError) and db.isTooManyContexts(error):
+        return render_template(
+            '404.jinja2', message="Too many open cursors. Try again later"
+        ), 503
+    raise error
+
+
+def cursor_response(es_data: dict, fields: List[str]):
+    """ Return a page of /data as json or as an html table, depending on Accept header """
+    return _response(es_data, fields, {'next_cursor': es_data['next_cursor']},
+                     CURSOR_NOT_FOUND_MESSAGE, _next_cursor_url(es_data['next_cursor']))
+
+
+def _next_cursor_url(next_cursor: str) -> str:
+    """ Return the url of the next page of /data, empty if there are no more pages """
+    if not next_cursor:
+        return ''
+    return url_for('data_cursor', cursor=next_cursor, fields=request.args.get('fields'),
+                   page_size=request.args.get('page_size'))
+
+
+@app.route('/search')
+def search():
+    """
+    Search route: filters, ranges, sorting and aggregations run in ElasticSearch.
+    Arguments (all of them can be repeated):
+        filter=<field>:<value>            -> exact match, e.g. filter=company name:Nunavut
+        range=<field>:<operator>:<value>  -> operator gt, gte, lt or lte, e.g. range=stock:lt:10
+        sort=<field>:<asc|desc>           -> e.g. sort=current revenue:desc
+        agg=<terms|stats>:<field>         -> e.g. agg=terms:company name, agg=stats:rating
+    Also fields=a,b, page_size=n and agg_size=n (max buckets of terms aggregations).
+    """
+    try:
+        fields = _get_fields()
+        page_size = _get_page_size()
+        query_body = db.buildSearch(
+            filters=[_split_arg(arg, 2) for arg in request.args.getlist('filter')],
+            ranges=[_split_arg(arg, 3) for arg in request.args.getlist('range')],
+            sort=[_split_arg(arg, 2) for arg in request.args.getlist('sort')],
+            aggregations=[_split_arg(arg, 2) for arg in request.args.getlist('agg')],
+            fields=fields,
+            size=page_size,
+            aggregation_size=request.args.get('agg_size', 10, type=int)
+        )
+        with stage('elasticsearch'):
+            es_data = db.search(query_body, db.getClient())
+    except (ValueError, RequestError) as e:
+        return render_template('404.jinja2', message=f"Invalid search: {e}"), 400
+
+    aggregations = {
+        name: ([{'key': bucket['key'], 'count': bucket['doc_count']}
+                for bucket in result['buckets']] if 'buckets' in result else result)
+        for name, result in es_data.get('aggregations', {}).items()
+    }
+    return _response(es_data, fields, {'aggregations': aggregations},
+                     "No documents found for this search.")
+
+
+def _split_arg(arg: str, parts: int) -> tuple:
+    """ Split a field:value argument in a given number of parts. Raise ValueError if it can't """
+    values = tuple(arg.split(':', parts - 1))
+    if len(values) != parts:
+        raise ValueError(f"Invalid argument {arg}")
+    return values
+
+
+def _get_fields() -> List[str]:
+    """ Return the fields requested with fields=a,b (all by default). Raise ValueError if a
+    field does not exist """
+    fields_arg = request.args.get('fields')
+    if not fields_arg:
+        return db.FIELD_NAMES
+    fields = [field.strip() for field in fields_arg.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in db.FIELD_NAMES]
+    if unknown or not fields:
+        raise ValueError(f"Invalid fields: {', '.join(unknown)}. "
+                         f"Valid fields: {', '.join(db.FIELD_NAMES)}")
+    return fields
+
+
+def _get_page_size() -> int:
+    """ Return the page size requested with page_size=n. Raise ValueError if it is not valid """
+    page_size = request.args.get('page_size', db.PAGE_SIZE, type=int)
+    if not 1 <= page_size <= db.MAX_PAGE_SIZE:
+        raise ValueError(f"Invalid page_size. It must be between 1 and {db.MAX_PAGE_SIZE}")
+    return page_size
+
+
+def _stream_table(documents: Iterator[dict], columns: List[str], not_found_message: str,
+                  next_url: Union[str, Callable[[], str]] = ''):
+    """
+    Return an html table with the documents of an iterator, streamed to the client while they
+    are fetched from ElasticSearch. The first document is fetched before the response starts, so
+    its errors can still be answered with an error page.
+    :param next_url: url of the next page, or a function called after the last document
+    """
+    first = next(documents, None)
+    if first is None:
+        documents.close()
+        return render_template('404.jinja2', message=not_found_message)
+
+    context = {'columns': columns, 'data': itertools.chain([first], documents),
+               'next_url': next_url}
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template('table.jinja2').stream(context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    return app.response_class(stream_with_context(stream), mimetype='text/html')
+
+
+def _response(es_data, columns: List[str], extra: dict, not_found_message: str,
+              next_url: str = ''):
+    """ Return ElasticSearch data as json or as an html table, depending on Accept header """
+    results = [i['_source'] for i in es_data['hits']['hits']]
+    if 'application/json' in request.headers.get('Accept', ''):
+        total = es_data['hits'].get('total', 0)
+        with stage('serialize'):
+            return _json_response({
+                'total': total['value'] if isinstance(total, dict) else total,
+                **extra,
+                'results': results
+            })
     else:
-        results = [i['_source'] for i in es_data['hits']['hits']]
-        if not results:
-            return render_template(
-                '404.jinja2', message=f"Data not found for index {page} in ElasticSearch. "
-                                      f"Try a different value"
-            )
-        else:
-            return render_template('table.jinja2', columns=es_columns, data=results)
+        with stage('render'):
+            if not results:
+                return render_template('404.jinja2', message=not_found_message)
+            else:
+                return render_template('table.jinja2', columns=columns, data=results,
+                                       next_url=next_url)
+
+
+def _json_response(payload: dict):
+    """ Return a json response, gzip compressed if the client accepts it and it is big enough """
+    response = jsonify(payload)
+    response.vary.add('Accept-Encoding')
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and \
+            response.content_length >= GZIP_MIN_SIZE:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 
 
@@ -0,0 +1,92 @@
+"""
+ASGI entry point of the API, so one worker serves many concurrent /data requests while they wait
+on ElasticSearch, e.g.:
+    uvicorn asgi:application --workers 4
+/data is answered by an async handler with AsyncElasticsearch (requires elasticsearch[async]),
+with the same arguments, cursors, query cache and responses as the Flask route. Streamed html
+pages and the rest of the routes run in the Flask app, through asgiref's WsgiToAsgi (requires
+asgiref).
+"""
+
+import io
+import sys
+import database as db
+from asgiref.wsgi import WsgiToAsgi
+from elasticsearch import TransportError
+from flask import Response
+from app import app, cursor_arguments, cursor_error, cursor_response, streams_table
+from instrumentation import stage
+
+
+wsgi_application = WsgiToAsgi(app)
+
+
+async def application(scope: dict, receive, send) -> None:
+    """ ASGI application: async /data handler, the Flask app for the rest """
+    if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/data':
+        response = await data_cursor(scope)
+        if response is not None:
+            await _send(response, send)
+            return
+    await wsgi_application(scope, receive, send)
+
+
+async def data_cursor(scope: dict):
+    """
+    Async /data route (see app.data_cursor), run in a Flask request context so it shares the
+    request hooks (e.g. instrumentation), argument parsing and templates of the Flask app.
+    Return None if the page is a streamed html table, which the Flask app answers.
+    """
+    with app.request_context(_environ(scope)):
+        response = app.preprocess_request()
+        if response is None:
+            try:
+                cursor, fields, page_size = cursor_arguments()
+                if streams_table(page_size):
+                    return None
+                with stage('elasticsearch'):
+                    es_data = await db.getDataAfterAsync(cursor, db.getAsyncClient(), fields,
+                                                         page_size)
+                response = cursor_response(es_data, fields)
+            except (ValueError, TransportError) as e:
+                response = cursor_error(e)
+        return app.process_response(app.make_response(response))
+
+
+def _environ(scope: dict) -> dict:
+    """ Return the WSGI environ of an ASGI http request without body """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f"HTTP_{name}"
+        value = value.decode('latin-1')
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+async def _send(response: Response, send) -> None:
+    """ Send a Flask response through ASGI """
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': response.get_data()})
@@ -0,0 +1,89 @@
+""" Cache for ElasticSearch query results, with expiration (TTL) and LRU eviction """
+
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class QueryCache:
+    """
+    Cache of query results grouped by index, so all the results of an index can be invalidated
+    when it is reloaded.
+    Results are kept in memory, or in a SQLite file when a path is given, so several worker
+    processes share the same cache (and invalidations).
+    """
+    def __init__(self, ttl: float = 300, max_entries: int = 1000, path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires, index, result)
+        if path:
+            with self._connect() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS query_cache (key TEXT PRIMARY KEY, "
+                           "idx TEXT, expires REAL, used REAL, result TEXT)")
+
+    def get(self, index: str, key: str) -> Optional[dict]:
+        """ Return the cached result of a query, or None if it is missing or expired """
+        now = time.time()
+        if self.path:
+            with self._connect() as db:
+                row = db.execute("SELECT result FROM query_cache WHERE key = ? AND idx = ? "
+                                 "AND expires > ?", (key, index, now)).fetchone()
+                if row is None:
+                    return None
+                db.execute("UPDATE query_cache SET used = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != index:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, index: str, key: str, result: dict) -> None:
+        """ Store the result of a query """
+        now = time.time()
+        if self.path:
+            with self._connect() as db:
+                db.execute("INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?)",
+                           (key, index, now + self.ttl, now, json.dumps(result)))
+                db.execute("DELETE FROM query_cache WHERE expires <= ? OR key NOT IN "
+                           "(SELECT key FROM query_cache ORDER BY used DESC LIMIT ?)",
+                           (now, self.max_entries))
+            return
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, index, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, index: str) -> None:
+        """ Remove all the cached results of an index """
+        if self.path:
+            with self._connect() as db:
+                db.execute("DELETE FROM query_cache WHERE idx = ?", (index,))
+            return
+
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1] == index]:
+                del self._entries[key]
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """ Open the SQLite file, commit the transaction and close it """
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
@@ -1,21 +1,85 @@
 """ Connection to ElasticSearch database and methods to load a csv file into that database """
 
+import os
 import json
 import csv
-from elasticsearch import Elasticsearch, helpers
+import time
+import base64
+import asyncio
+import threading
+import weakref
+from typing import Iterator, Optional, Tuple, List
+from elasticsearch import Elasticsearch, TransportError, helpers
+from cache import QueryCache
 
 
 
 CREDENTIALS = "resources/credentials.json"
 FIELD_NAMES = ["id", "inventory name", "contact name", "stock", "last revenue",
                "current revenue", "refund", "company name", "categories", "rating"]
+INDEX = "second_load"
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 10000
+SCROLL_BATCH_SIZE = 1000  # documents per request when iterating large pages
+PIT_KEEP_ALIVE = "5m"  # how long a point in time is kept between two pages
 
+# Response fields returned by ElasticSearch (the rest of the metadata is filtered out)
+FILTER_PATH = "hits.total,hits.hits._source"
+FILTER_PATH_CURSOR = "pit_id,hits.total,hits.hits._source,hits.hits.sort"
+FILTER_PATH_SEARCH = "hits.total,hits.hits._source,aggregations"
 
-def ElasticSearchConnection():
-    """Connect to ElasticSearch"""
+# Search operators and aggregations
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+AGGREGATION_TYPES = ("terms", "stats")
+
+# Client settings: timeouts, retries and connections kept alive per node
+CLIENT_OPTIONS = {
+    "timeout": int(os.environ.get("ES_TIMEOUT", 30)),
+    "max_retries": int(os.environ.get("ES_MAX_RETRIES", 3)),
+    "retry_on_timeout": True,
+    "maxsize": int(os.environ.get("ES_MAXSIZE", 25)),
+    "http_compress": True,
+}
+
+# Query result cache: seconds before results expire, max number of results and optional
+# SQLite file to share the cache between worker processes
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", 300))
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 1000))
+QUERY_CACHE_PATH = os.environ.get("QUERY_CACHE_PATH")
+# Seconds between checks of the index generation, so results cached by every process are
+# invalidated when the index is reloaded (also from another process)
+QUERY_CACHE_GENERATION_CHECK = float(os.environ.get("QUERY_CACHE_GENERATION_CHECK", 5))
+
+# Bulk load settings
+CHUNK_SIZE = 1000   # documents per bulk request
+THREAD_COUNT = 4    # concurrent bulk requests
+
+# Explicit mapping of the csv columns. Names are also stored as keyword to filter, sort and
+# aggregate on them.
+MAPPING = {
+    "properties": {
+        "id": {"type": "integer"},
+        "inventory name": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+        "contact name": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+        "stock": {"type": "integer"},
+        "last revenue": {"type": "float"},
+        "current revenue": {"type": "float"},
+        "refund": {"type": "float"},
+        "company name": {"type": "keyword"},
+        "categories": {"type": "keyword"},
+        "rating": {"type": "float"}
+    }
+}
+NUMERIC_FIELDS = {"id": int, "stock": int, "last revenue": float, "current revenue": float,
+                  "refund": float, "rating": float}
+
+
+def ElasticSearchConnection(**options):
+    """Connect to ElasticSearch. Options override CLIENT_OPTIONS"""
     try:
         _USER, _PASSWORD, _CLOUD_ID = json.load(open(CREDENTIALS)).values()
-        return Elasticsearch(cloud_id=_CLOUD_ID, http_auth=(_USER, _PASSWORD), timeout=60)
+        return Elasticsearch(cloud_id=_CLOUD_ID, http_auth=(_USER, _PASSWORD),
+                             **{**CLIENT_OPTIONS, **options})
     except ConnectionError:
         print("Error connecting to ElasticSearch\n")
         raise
@@ -24,32 +88,476 @@ def ElasticSearchConnection():
         raise
 
 
-def loadCsv(filepath: str, es_client: Elasticsearch, fieldnames=None):
-    """Load csv file into ElasticSearch"""
+def AsyncElasticSearchConnection(**options):
+    """Connect to ElasticSearch with an async client (requires elasticsearch[async]). Options
+    override CLIENT_OPTIONS"""
+    from elasticsearch import AsyncElasticsearch
     try:
-        csv_file = csv.DictReader(open(filepath, "r"), fieldnames=fieldnames)
-        response = helpers.bulk(es_client, csv_file, index="second_load",)
-        print("RESPONSE: ", response)
-    except Exception as e:
-        print("ERROR: ", e)
+        _USER, _PASSWORD, _CLOUD_ID = json.load(open(CREDENTIALS)).values()
+        return AsyncElasticsearch(cloud_id=_CLOUD_ID, http_auth=(_USER, _PASSWORD),
+                                  **{**CLIENT_OPTIONS, **options})
+    except FileNotFoundError:
+        print(f"File {CREDENTIALS} not found\n")
+        raise
+
+
+query_cache = QueryCache(QUERY_CACHE_TTL, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_PATH)
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> async client
+_clients_lock = threading.Lock()
+_generations = {}  # index -> (time of the last check, generation)
+
+
+def getClient() -> Elasticsearch:
+    """
+    Return the ElasticSearch client of the current process, created on first use.
+    Every worker process gets its own client (and connection pool), also after a fork.
+    """
+    pid = os.getpid()
+    if pid not in _clients:
+        with _clients_lock:
+            if pid not in _clients:
+                _clients[pid] = ElasticSearchConnection()
+    return _clients[pid]
+
+
+def getAsyncClient():
+    """
+    Return the async ElasticSearch client of the running event loop, created on first use.
+    Async clients can only be used from the event loop they were created in.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = AsyncElasticSearchConnection()
+    return _async_clients[loop]
+
+
+def convertRow(row: dict) -> dict:
+    """ Convert the numeric columns of a csv row. Values that can't be converted are None """
+    document = dict(row)
+    for field, convert in NUMERIC_FIELDS.items():
+        value = document.get(field)
+        if value is None:
+            continue
+        try:
+            document[field] = convert(float(value.replace(",", "")))
+        except (ValueError, OverflowError):
+            document[field] = None
+    return document
+
+
+def _reportChunk(documents: int, failed: int, start: float) -> None:
+    """ Print throughput and failures of a bulk chunk """
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Chunk: {documents} documents, {documents / elapsed:.0f} docs/s, {failed} failed")
 
 
-def getData(n: int, es_client: Elasticsearch):
-    """ Query data from ElasticSearch """
+def _createIndex(es_client: Elasticsearch, recreate: bool = False) -> None:
+    """
+    Create the index with MAPPING if it does not exist.
+    Raise ValueError if it exists with a different mapping (e.g. created with dynamic mapping),
+    unless recreate is True, then it is deleted and created again (its documents are lost).
+    """
+    if es_client.indices.exists(index=INDEX):
+        mappings = es_client.indices.get_mapping(index=INDEX)[INDEX]["mappings"]
+        properties = mappings.get("properties", {})
+        different = [field for field, definition in MAPPING["properties"].items()
+                     if properties.get(field) != definition]
+        if not different:
+            return
+        if not recreate:
+            print(f"Error, index {INDEX} has a different mapping for: {', '.join(different)}\n")
+            raise ValueError(f"Index {INDEX} mapping differs from MAPPING. "
+                             f"Load with recreate=True to delete and create it again")
+        print(f"Deleting index {INDEX}, its mapping differs for: {', '.join(different)}")
+        es_client.indices.delete(index=INDEX)
+    es_client.indices.create(index=INDEX, body={"mappings": MAPPING})
+
+
+def loadCsv(filepath: str, es_client: Elasticsearch, fieldnames=None,
+            chunk_size: int = CHUNK_SIZE, thread_count: int = THREAD_COUNT,
+            recreate: bool = False) -> Tuple[int, List]:
+    """
+    Load csv file into ElasticSearch.
+    The file is streamed through parallel bulk requests, with numeric columns converted and an
+    explicit mapping (an existing index must have the same mapping, see recreate). Refresh and
+    replicas are disabled during the load and restored after it.
+    Throughput and failures are reported for every chunk.
+    :param filepath: path to csv file
+    :param es_client: ElasticSearch client
+    :param fieldnames: csv columns, if the file has no header
+    :param chunk_size: documents per bulk request
+    :param thread_count: concurrent bulk requests
+    :param recreate: delete and create the index again if its mapping differs from MAPPING
+    :return: number of documents loaded and list of failed documents
+    """
+    _createIndex(es_client, recreate)
+
+    settings = es_client.indices.get_settings(index=INDEX)[INDEX]["settings"]["index"]
+    es_client.indices.put_settings(
+        index=INDEX, body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}}
+    )
+
+    loaded, failed = 0, []
+    try:
+        with open(filepath, "r", newline="") as f:
+            actions = (
+                {"_index": INDEX, "_source": convertRow(row)}
+                for row in csv.DictReader(f, fieldnames=fieldnames)
+            )
+            chunk, chunk_failed, chunk_start = 0, 0, time.perf_counter()
+            for ok, info in helpers.parallel_bulk(
+                    es_client, actions, thread_count=thread_count, chunk_size=chunk_size,
+                    raise_on_error=False, raise_on_exception=False
+            ):
+                chunk += 1
+                if ok:
+                    loaded += 1
+                else:
+                    chunk_failed += 1
+                    failed.append(info)
+                if chunk == chunk_size:
+                    _reportChunk(chunk, chunk_failed, chunk_start)
+                    chunk, chunk_failed, chunk_start = 0, 0, time.perf_counter()
+            if chunk:
+                _reportChunk(chunk, chunk_failed, chunk_start)
+    except FileNotFoundError:
+        print(f"File {filepath} not found\n")
+        raise
+    finally:
+        es_client.indices.put_settings(index=INDEX, body={"index": {
+            "refresh_interval": settings.get("refresh_interval"),
+            "number_of_replicas": settings.get("number_of_replicas", 1)
+        }})
+        es_client.indices.refresh(index=INDEX)
+        # A new generation invalidates the results cached by all processes
+        es_client.indices.put_mapping(index=INDEX, body={"_meta": {"generation": time.time()}})
+        _generations.pop(INDEX, None)
+        query_cache.invalidate(INDEX)
+
+    print(f"Loaded {loaded} documents, {len(failed)} failed")
+    for info in failed[:10]:
+        print("ERROR: ", info)
+    return loaded, failed
+
+
+def getData(n: int, es_client: Elasticsearch, fields: Optional[List[str]] = None,
+            size: int = PAGE_SIZE):
+    """
+    Query data from ElasticSearch. Results are cached in query_cache.
+    Only the hits _source (with the given fields, all by default) and the total are returned.
+    """
     query_body = {
         "query": {"match_all": {}},
-        "from": n*20,
-        "size": 20
+        "_source": fields or FIELD_NAMES,
+        "from": n*size,
+        "size": size
     }
-    response = es_client.search(index="second_load", body=query_body)
+    cache_key = _cacheKey("query", query_body, _indexGeneration(es_client))
+    response = query_cache.get(INDEX, cache_key)
+    if response is None:
+        response = _withHits(es_client.search(index=INDEX, body=query_body,
+                                              filter_path=FILTER_PATH))
+        query_cache.set(INDEX, cache_key, response)
+    return response
+
+
+def _cacheKey(kind: str, query_body: dict, generation) -> str:
+    """ Return the query_cache key of a query, which includes the index generation """
+    return json.dumps({"index": INDEX, "generation": generation, kind: query_body},
+                      sort_keys=True)
+
+
+def _indexGeneration(es_client: Elasticsearch):
+    """
+    Return the generation of the index, stored in its mapping (_meta) by loadCsv, or None if it
+    was never set. It is read from ElasticSearch at most every QUERY_CACHE_GENERATION_CHECK
+    seconds, so results cached before a reload in another process stop being used after that.
+    """
+    checked, generation = _generations.get(INDEX, (None, None))
+    if checked is None or time.monotonic() - checked >= QUERY_CACHE_GENERATION_CHECK:
+        generation = _setGeneration(
+            es_client.indices.get_mapping(index=INDEX, filter_path="*.mappings._meta")
+        )
+    return generation
+
+
+async def _indexGenerationAsync(es_client):
+    """ Return the generation of the index with an async client (see _indexGeneration) """
+    checked, generation = _generations.get(INDEX, (None, None))
+    if checked is None or time.monotonic() - checked >= QUERY_CACHE_GENERATION_CHECK:
+        generation = _setGeneration(
+            await es_client.indices.get_mapping(index=INDEX, filter_path="*.mappings._meta")
+        )
+    return generation
+
+
+def _setGeneration(response: dict):
+    """ Store and return the index generation of a get_mapping response """
+    mapping = next(iter(response.values()), {}).get("mappings", {})
+    generation = mapping.get("_meta", {}).get("generation")
+    _generations[INDEX] = (time.monotonic(), generation)
+    return generation
+
+
+def _withHits(response: dict) -> dict:
+    """ Add the hits list to a response, filter_path removes it when there are no hits """
+    response.setdefault("hits", {}).setdefault("hits", [])
     return response
 
 
+def _searchField(field: str) -> str:
+    """ Return the field used to filter, sort and aggregate (keyword subfield for text fields).
+    Raise ValueError if the field does not exist """
+    if field not in MAPPING["properties"]:
+        raise ValueError(f"Invalid field {field}. Valid fields: {', '.join(FIELD_NAMES)}")
+    return f"{field}.keyword" if MAPPING["properties"][field]["type"] == "text" else field
+
+
+def buildSearch(filters: List[Tuple[str, str]], ranges: List[Tuple[str, str, str]],
+                sort: List[Tuple[str, str]], aggregations: List[Tuple[str, str]],
+                fields: Optional[List[str]] = None, size: int = PAGE_SIZE,
+                aggregation_size: int = 10) -> dict:
+    """
+    Return the body of a search, so filters and aggregations run in ElasticSearch.
+    Raise ValueError if a field, operator or aggregation is not valid.
+    :param filters: (field, value) exact matches
+    :param ranges: (field, operator, value) ranges, operator from RANGE_OPERATORS
+    :param sort: (field, order) with order asc or desc
+    :param aggregations: (type, field) aggregations, type from AGGREGATION_TYPES
+    :param fields: fields to return (all by default)
+    :param size: max number of documents to return
+    :param aggregation_size: max number of buckets for terms aggregations
+    """
+    query_filters = [{"term": {_searchField(field): value}} for field, value in filters]
+    for field, operator, value in ranges:
+        if operator not in RANGE_OPERATORS:
+            raise ValueError(f"Invalid range operator {operator}. "
+                             f"Valid operators: {', '.join(RANGE_OPERATORS)}")
+        query_filters.append({"range": {_searchField(field): {operator: value}}})
+
+    query_sort = []
+    for field, order in sort:
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Invalid sort order {order}. Valid orders: asc, desc")
+        query_sort.append({_searchField(field): order})
+
+    query_aggregations = {}
+    for aggregation_type, field in aggregations:
+        if aggregation_type == "terms":
+            body = {"field": _searchField(field), "size": aggregation_size}
+        elif aggregation_type == "stats":
+            if field not in NUMERIC_FIELDS:
+                raise ValueError(f"Invalid field {field} for stats. "
+                                 f"Valid fields: {', '.join(NUMERIC_FIELDS)}")
+            body = {"field": field}
+        else:
+            raise ValueError(f"Invalid aggregation {aggregation_type}. "
+                             f"Valid aggregations: {', '.join(AGGREGATION_TYPES)}")
+        query_aggregations[f"{aggregation_type}:{field}"] = {aggregation_type: body}
+
+    query_body = {
+        "query": {"bool": {"filter": query_filters}} if query_filters else {"match_all": {}},
+        "_source": fields or FIELD_NAMES,
+        "size": size
+    }
+    if query_sort:
+        query_body["sort"] = query_sort
+    if query_aggregations:
+        query_body["aggs"] = query_aggregations
+    return query_body
+
+
+def search(query_body: dict, es_client: Elasticsearch) -> dict:
+    """ Run a search built with buildSearch. Results are cached in query_cache """
+    cache_key = _cacheKey("search", query_body, _indexGeneration(es_client))
+    response = query_cache.get(INDEX, cache_key)
+    if response is None:
+        response = _withHits(es_client.search(index=INDEX, body=query_body,
+                                              filter_path=FILTER_PATH_SEARCH))
+        query_cache.set(INDEX, cache_key, response)
+    return response
+
+
+def encodeCursor(pit_id: Optional[str], search_after: list) -> str:
+    """ Return an opaque cursor from a point in time id (None on the first page) and the sort
+    values of the last hit """
+    return base64.urlsafe_b64encode(json.dumps([pit_id, search_after]).encode()).decode()
+
+
+def decodeCursor(cursor: str) -> tuple:
+    """ Return the point in time id and sort values stored in a cursor. Raise ValueError if
+    the cursor is not valid """
+    try:
+        pit_id, search_after = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(search_after, list) or not search_after:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return pit_id, search_after
+
+
+def getDataAfter(cursor: Optional[str], es_client: Elasticsearch,
+                 fields: Optional[List[str]] = None, size: int = PAGE_SIZE):
+    """
+    Query the page of data after a cursor (the first page if there is no cursor).
+    Pages are sorted by id and use search_after, so deep pages cost the same as the first one
+    (no from/size, no index.max_result_window limit). The first page is a plain search, cached in
+    query_cache; the point in time that keeps the next pages stable is opened on the second page,
+    so visitors who only read the first page do not keep one open.
+    The response includes 'next_cursor', empty when there are no more pages.
+    """
+    query_body, pit_id = _cursorQuery(cursor, fields, size)
+    if not cursor:
+        cache_key = _cacheKey("cursor", query_body, _indexGeneration(es_client))
+        response = query_cache.get(INDEX, cache_key)
+        if response is None:
+            response = _withHits(es_client.search(index=INDEX, body=query_body,
+                                                  filter_path=FILTER_PATH_CURSOR))
+            query_cache.set(INDEX, cache_key, response)
+        return _withNextCursor(response, None, size)
+
+    if pit_id is None:
+        pit_id = es_client.open_point_in_time(index=INDEX, keep_alive=PIT_KEEP_ALIVE)["id"]
+    query_body["pit"] = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+    response = _withNextCursor(
+        _withHits(es_client.search(body=query_body, filter_path=FILTER_PATH_CURSOR)),
+        pit_id, size
+    )
+    if not response["next_cursor"]:
+        es_client.close_point_in_time(body={"id": response.get("pit_id", pit_id)})
+    return response
+
+
+async def getDataAfterAsync(cursor: Optional[str], es_client,
+                            fields: Optional[List[str]] = None, size: int = PAGE_SIZE):
+    """ Query the page of data after a cursor with an async client (see getDataAfter) """
+    query_body, pit_id = _cursorQuery(cursor, fields, size)
+    if not cursor:
+        cache_key = _cacheKey("cursor", query_body, await _indexGenerationAsync(es_client))
+        response = query_cache.get(INDEX, cache_key)
+        if response is None:
+            response = _withHits(await es_client.search(index=INDEX, body=query_body,
+                                                        filter_path=FILTER_PATH_CURSOR))
+            query_cache.set(INDEX, cache_key, response)
+        return _withNextCursor(response, None, size)
+
+    if pit_id is None:
+        pit_id = (await es_client.open_point_in_time(index=INDEX,
+                                                     keep_alive=PIT_KEEP_ALIVE))["id"]
+    query_body["pit"] = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+    response = _withNextCursor(
+        _withHits(await es_client.search(body=query_body, filter_path=FILTER_PATH_CURSOR)),
+        pit_id, size
+    )
+    if not response["next_cursor"]:
+        await es_client.close_point_in_time(body={"id": response.get("pit_id", pit_id)})
+    return response
+
+
+def _cursorQuery(cursor: Optional[str], fields: Optional[List[str]],
+                 size: int) -> Tuple[dict, Optional[str]]:
+    """
+    Return the query body (without point in time) of the page after a cursor and the point in
+    time id of the cursor, None on the first two pages. Raise ValueError if the cursor is not valid
+    """
+    query_body = {
+        "query": {"match_all": {}},
+        "_source": fields or FIELD_NAMES,
+        "size": size,
+        "sort": [{"id": "asc"}]
+    }
+    if not cursor:
+        return query_body, None
+    pit_id, search_after = decodeCursor(cursor)
+    if pit_id is None:
+        # Second page: the first one had no point in time (nor its _shard_doc tiebreaker), so
+        # it continues after the last id
+        query_body["query"] = {"range": {"id": {"gt": search_after[0]}}}
+    else:
+        query_body["search_after"] = search_after
+    return query_body, pit_id
+
+
+def _withNextCursor(response: dict, pit_id: Optional[str], size: int) -> dict:
+    """ Return a copy of a page with 'next_cursor', empty if it is the last page """
+    hits = response["hits"]["hits"]
+    next_cursor = ""
+    if len(hits) == size:
+        next_cursor = encodeCursor(response.get("pit_id", pit_id), hits[-1]["sort"])
+    return {**response, "next_cursor": next_cursor}
+
+
+def isTooManyContexts(error: TransportError) -> bool:
+    """ Return True if an error was raised because the cluster has too many open search contexts
+    (e.g. points in time), so the request can be retried later """
+    return "too many" in str(error).lower()
+
+
+def iterDataAfter(cursor: Optional[str], count: int, es_client: Elasticsearch,
+                  fields: Optional[List[str]] = None, batch_size: int = SCROLL_BATCH_SIZE,
+                  page: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Yield the _source of the `count` documents after a cursor (the page of getDataAfter).
+    Documents are fetched in batches with getDataAfter, so memory does not grow with the page
+    size. Once all of them are yielded, page['next_cursor'] is the cursor of the next page (empty
+    when there are no more pages).
+    """
+    page = {} if page is None else page
+    while True:
+        response = getDataAfter(cursor, es_client, fields, min(batch_size, count))
+        hits = response["hits"]["hits"]
+        for hit in hits:
+            yield hit["_source"]
+        cursor = response["next_cursor"]
+        count -= len(hits)
+        if not cursor or count <= 0:
+            break
+    page["next_cursor"] = cursor
+
+
+def iterData(offset: int, count: int, es_client: Elasticsearch,
+             fields: Optional[List[str]] = None,
+             batch_size: int = SCROLL_BATCH_SIZE) -> Iterator[dict]:
+    """
+    Yield the _source of `count` documents starting at `offset`.
+    Documents are fetched in batches with search_after over a point in time, so memory does
+    not grow with the number of documents. The first batch uses `from`, so offset + batch_size
+    must be within index.max_result_window.
+    """
+    pit_id = es_client.open_point_in_time(index=INDEX, keep_alive=PIT_KEEP_ALIVE)["id"]
+    query_body = {
+        "query": {"match_all": {}},
+        "_source": fields or FIELD_NAMES,
+        "from": offset,
+        "size": min(batch_size, count),
+        "sort": [{"_shard_doc": "asc"}]
+    }
+    try:
+        while count > 0:
+            pit = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+            response = _withHits(es_client.search(body={**query_body, "pit": pit},
+                                                  filter_path=FILTER_PATH_CURSOR))
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            for hit in hits:
+                yield hit["_source"]
+            count -= len(hits)
+            if len(hits) < query_body["size"]:
+                break
+            query_body = {key: value for key, value in query_body.items() if key != "from"}
+            query_body["size"] = min(batch_size, count)
+            query_body["search_after"] = hits[-1]["sort"]
+    finally:
+        es_client.close_point_in_time(body={"id": pit_id})
+
+
 
 
 
 if __name__ == '__main__':
-    es = ElasticSearchConnection()
+    es = getClient()
     print(es.ping())
     # loadCsv("resources/SampleCSVFile_556kb.csv", es, FIELD_NAMES)
     print(getData(0, es))
@@ -10,23 +10,49 @@ http://127.0.0.1:5000/parks?start=1&limit=10&start_date=2020-01-01&end_date=2021
 http://127.0.0.1:5000/Bemmel
 http://127.0.0.1:5000/Bemmel?start_date=2020-01-01&end_date=2020-03-01
 http://127.0.0.1:5000/Bemmel?start=1&limit=18&start_date=2021-01-01&end_date=2022-02-01
+
+Cursor (keyset) pagination: pass an empty cursor to get the first page and then follow the
+"next" URL, which stores the last datetime returned for every park.
+http://127.0.0.1:5000/parks?cursor=&limit=100
+http://127.0.0.1:5000/Bemmel?cursor=&limit=24&start_date=2020-01-01&end_date=2020-03-01
+
+Streamed exports (NDJSON, one production row per line): use format=ndjson or send the header
+"Accept: application/x-ndjson".
+http://127.0.0.1:5000/parks?format=ndjson&limit=500000
+http://127.0.0.1:5000/Bemmel?format=ndjson&limit=500000&start_date=2020-01-01&end_date=2020-12-01
+
+Production resampled server-side (freq is a pandas frequency, agg from sum/mean/min/max/count):
+http://127.0.0.1:5000/Bemmel/aggregate?freq=1D&agg=sum,mean,max
+http://127.0.0.1:5000/Bemmel/aggregate?freq=MS&agg=sum&start_date=2020-01-01&end_date=2020-12-31
+
+Request timings (Server-Timing header) and latency histograms, with FLASK_INSTRUMENTATION=1:
+http://127.0.0.1:5000/metrics
 """
 
 
 import views
 from flask import Flask
 from flask_restful import Api
+from instrumentation import Instrumentation
 
 
 # Create our Flask application
 app = Flask(__name__)
 
 
+# Opt-in request instrumentation (see instrumentation.py)
+Instrumentation(app)
+
+
 # Create our API application
 api = Api(app)
 
 # Add resources
 api.add_resource(views.ParksListAPI, '/parks')
 api.add_resource(views.ParkAPI, '/<string:park>')
+api.add_resource(views.ParkAggregateAPI, '/<string:park>/aggregate')
+
 
-app.run(port=5000, debug=True)
+# Run application
+if __name__ == '__main__':
+    app.run(port=5000, debug=True)
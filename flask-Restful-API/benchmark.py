@@ -0,0 +1,219 @@
+"""
+Load-test and latency benchmark for the API.
+It generates synthetic park data, runs the application in-process (Flask test client) or
+behind a local WSGI server, and drives it with a mix of representative queries. For every
+query type it reports p50/p95/p99 latency and throughput, plus the peak RSS of the process.
+
+Usage examples:
+    python benchmark.py
+    python benchmark.py --parks 20 --years 5 --requests 500 --concurrency 8
+    python benchmark.py --server --no-cache --mix date_range,deep_page
+    python benchmark.py --input-dir ./input --binary
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import urllib.request
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable, Dict, List
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# Query types, every one builds a URL from a park name and the range of available dates
+QUERY_MIX: Dict[str, Callable[[str, pd.Timestamp, pd.Timestamp], str]] = {
+    'date_range': lambda park, first, last: (
+        f"/{park}?limit=100&start_date={_random_date(first, last):%Y-%m-%d}"
+        f"&end_date={_random_date(first, last) + pd.Timedelta(days=30):%Y-%m-%d}"
+    ),
+    'deep_page': lambda park, first, last: (
+        f"/{park}?limit=100&start={random.randint(1, _hours(first, last) - 100)}"
+    ),
+    'large_limit': lambda park, first, last: f"/{park}?limit=50000",
+    'all_parks': lambda park, first, last: "/parks?limit=100",
+    'cursor': lambda park, first, last: f"/{park}?cursor=&limit=1000",
+    'aggregate': lambda park, first, last: f"/{park}/aggregate?freq=1D&agg=sum,mean,max",
+}
+
+
+def _random_date(first: pd.Timestamp, last: pd.Timestamp) -> pd.Timestamp:
+    """ Return a random date between two timestamps. """
+    return first + pd.Timedelta(days=random.randint(0, max(0, (last - first).days - 31)))
+
+
+def _hours(first: pd.Timestamp, last: pd.Timestamp) -> int:
+    """ Return the number of hours between two timestamps. """
+    return int((last - first) / pd.Timedelta(hours=1))
+
+
+def generate_input(input_dir: Path, n_parks: int, years: int) -> List[str]:
+    """
+    Write park_info.csv and one csv file with hourly production per park.
+    :param input_dir: directory to write csv files
+    :param n_parks: number of parks
+    :param years: years of hourly production for every park
+    :return: the list of park names
+    """
+    input_dir.mkdir(parents=True, exist_ok=True)
+    park_names = [f"Park{i}" for i in range(n_parks)]
+    pd.DataFrame({
+        'park_name': park_names,
+        'timezone': 'Europe/Amsterdam',
+        'energy_type': [random.choice(['Wind', 'Solar']) for _ in park_names]
+    }).to_csv(input_dir / 'park_info.csv', index=False)
+
+    index = pd.date_range('2020-01-01', periods=years * 365 * 24, freq='h',
+                          tz='Europe/Amsterdam')
+    datetimes = index.strftime('%Y-%m-%d %H:%M:%S%z')
+    for park in park_names:
+        pd.DataFrame({
+            'datetime': datetimes,
+            'MW': np.random.rand(len(index)) * 10
+        }).to_csv(input_dir / f'{park}.csv', index=False)
+    return park_names
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """ Return the percentile of a list of values (nearest rank). """
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    """ Return the peak resident set size of this process in MB, or nan if unavailable. """
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_queries(get: Callable[[str], int], urls: List[str], concurrency: int) -> List[float]:
+    """
+    Request all the URLs with a number of concurrent threads.
+    :param get: function that requests a URL and returns the status code
+    :param urls: URLs to request
+    :param concurrency: number of concurrent threads
+    :return: latency of every request, in seconds
+    """
+    latencies = []
+    lock = threading.Lock()
+    pending = iter(urls)
+
+    def worker():
+        while True:
+            with lock:
+                url = next(pending, None)
+            if url is None:
+                return
+            start = time.perf_counter()
+            status = get(url)
+            elapsed = time.perf_counter() - start
+            if status >= 400:
+                print(f"Error {status} requesting {url}")
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main(args: argparse.Namespace) -> None:
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    # Input data
+    if args.input_dir:
+        input_dir = Path(args.input_dir)
+        park_names = pd.read_csv(input_dir / 'park_info.csv')['park_name'].tolist()
+    else:
+        input_dir = Path(tempfile.mkdtemp(prefix='parks_benchmark_'))
+        print(f"Generating {args.parks} parks with {args.years} years of data in {input_dir}...")
+        park_names = generate_input(input_dir, args.parks, args.years)
+    if args.binary:
+        import ingest
+        ingest.convert_input_dir(input_dir)
+
+    # The application reads the input directory when views is imported
+    os.environ['PARKS_INPUT_DIR'] = str(input_dir)
+    from app import app
+    import views
+    if args.no_cache:
+        views.response_cache.max_entries = 0
+
+    first = pd.Timestamp('2020-01-01')
+    last = first + pd.Timedelta(days=args.years * 365)
+
+    if args.server:
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no request logs
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        def get(url: str) -> int:
+            try:
+                with urllib.request.urlopen(base_url + url) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+    else:
+        local = threading.local()
+
+        def get(url: str) -> int:
+            if not hasattr(local, 'client'):
+                local.client = app.test_client()
+            return local.client.get(url).status_code
+
+    # Warm up: load every park once
+    for park in park_names:
+        get(f"/{park}?limit=1")
+
+    print(f"{'query':<12} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for name in args.mix.split(','):
+        urls = [QUERY_MIX[name](random.choice(park_names), first, last)
+                for _ in range(args.requests)]
+        start = time.perf_counter()
+        latencies = run_queries(get, urls, args.concurrency)
+        total = time.perf_counter() - start
+        print(f"{name:<12} {len(latencies):>8} "
+              f"{percentile(latencies, 50) * 1000:>9.2f} "
+              f"{percentile(latencies, 95) * 1000:>9.2f} "
+              f"{percentile(latencies, 99) * 1000:>9.2f} "
+              f"{len(latencies) / total:>9.1f}")
+
+    print(f"Peak RSS: {peak_rss_mb():.1f} MB")
+    if args.server:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the parks API.")
+    parser.add_argument('--parks', type=int, default=10, help="number of synthetic parks")
+    parser.add_argument('--years', type=int, default=2, help="years of hourly data per park")
+    parser.add_argument('--input-dir', help="use existing input data instead of synthetic data")
+    parser.add_argument('--binary', action='store_true', help="convert input with ingest.py")
+    parser.add_argument('--requests', type=int, default=200, help="requests per query type")
+    parser.add_argument('--concurrency', type=int, default=4, help="concurrent clients")
+    parser.add_argument('--mix', default=','.join(QUERY_MIX),
+                        help=f"comma separated query types from {', '.join(QUERY_MIX)}")
+    parser.add_argument('--server', action='store_true',
+                        help="run a local WSGI server instead of the Flask test client")
+    parser.add_argument('--no-cache', action='store_true', help="disable the response cache")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    main(parser.parse_args())
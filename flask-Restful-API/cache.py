@@ -0,0 +1,58 @@
+"""
+This module contains an in-process cache for serialized API responses.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized responses, bounded both by number of entries and by total size.
+    Every entry stores the response body and its ETag.
+    """
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        """ Return the (etag, body) stored for a key, or None if it is not cached. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: Hashable, body: bytes) -> str:
+        """
+        Store a response body and return its ETag.
+        Bodies bigger than the cache itself are not stored.
+        """
+        etag = hashlib.sha1(body).hexdigest()
+        if len(body) > self.max_bytes:
+            return etag
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key)[1])
+            self._entries[key] = (etag, body)
+            self._size += len(body)
+
+            # Evict least recently used entries
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, old_body) = self._entries.popitem(last=False)
+                self._size -= len(old_body)
+        return etag
+
+    def clear(self) -> None:
+        """ Remove all the entries. """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,81 @@
+"""
+Convert park csv files into binary files (.npy) that the API memory-maps instead of parsing.
+Every csv file in the input directory gets .npy files with the same name:
+    -park_info.npy         -> structured array with park_name, timezone and energy_type
+    -<park>.npy            -> timestamp column (datetime64), sorted
+    -<park>.datetime.npy   -> datetime column (original labels), in the same order
+    -<park>.MW.npy         -> MW column, in the same order
+Every column is a separate file, so binary searches and scans read contiguous memory.
+Files are written to a temporary file and then renamed, so running workers keep reading the
+previous version (memory-mapped) until they reload it. <park>.npy is renamed last.
+Run this script every time a new csv file lands. Usage:
+    python ingest.py [input_dir]
+"""
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+def column_path(park_data_npy: Path, column: str) -> Path:
+    """ Return the path to a production column (datetime or MW) of a park binary file. """
+    return park_data_npy.with_suffix(f'.{column}.npy')
+
+
+def _save(npy_path: Path, data: np.ndarray) -> None:
+    """ Write a .npy file to a temporary file and rename it, replacing the previous file. """
+    fd, tmp_path = tempfile.mkstemp(dir=npy_path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            np.save(tmp_file, data)
+        os.replace(tmp_path, npy_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def convert_park_info(park_info_csv: Path) -> Path:
+    """ Convert the csv file with park information into a .npy file and return its path. """
+    park_info = pd.read_csv(park_info_csv, dtype=str)[['park_name', 'timezone', 'energy_type']]
+    data = np.array(
+        list(park_info.itertuples(index=False, name=None)),
+        dtype=[(name, f'U{max(1, park_info[name].str.len().max())}') for name in park_info]
+    )
+    npy_path = park_info_csv.with_suffix('.npy')
+    _save(npy_path, data)
+    return npy_path
+
+
+def convert_park(park_data_csv: Path) -> Path:
+    """
+    Convert a csv file with park production into .npy files (one per column) and return the
+    path of the timestamp column.
+    """
+    production = pd.read_csv(park_data_csv)
+    timestamps = pd.to_datetime(production['datetime'].str[0:19])
+    order = timestamps.argsort(kind='mergesort')
+
+    npy_path = park_data_csv.with_suffix('.npy')
+    _save(column_path(npy_path, 'datetime'), production['datetime'].values[order].astype(bytes))
+    _save(column_path(npy_path, 'MW'), production['MW'].values[order].astype('float64'))
+    _save(npy_path, timestamps.values[order].astype('datetime64[s]'))
+    return npy_path
+
+
+def convert_input_dir(input_dir: Path) -> None:
+    """ Convert every csv file in a directory. """
+    for csv_path in sorted(input_dir.glob('*.csv')):
+        try:
+            if csv_path.stem == 'park_info':
+                npy_path = convert_park_info(csv_path)
+            else:
+                npy_path = convert_park(csv_path)
+            print(f"{csv_path} converted to {npy_path}")
+        except (KeyError, ValueError) as e:
+            print(f"Error converting {csv_path}: {e}")
+
+
+if __name__ == '__main__':
+    convert_input_dir(Path(sys.argv[1] if len(sys.argv) == 2 else './input'))
@@ -0,0 +1,174 @@
+"""
+Opt-in per-request instrumentation for Flask applications.
+Set the environment variable FLASK_INSTRUMENTATION=1 to enable it. Then:
+    -Views record the time spent in every stage with `with stage('name'):`, also in worker
+     threads running functions wrapped with propagate_stages (their durations add up)
+    -Every response includes a Server-Timing header with the stage timings
+    -METRICS_PATH returns latency histograms per endpoint and stage as JSON
+    -A sample of requests (PROFILE_SAMPLE_RATE) runs under cProfile, and the stats of the ones
+     slower than SLOW_REQUEST_SECONDS are written to PROFILE_DIR
+"""
+import os
+import time
+import random
+import cProfile
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import Flask, g, has_request_context, jsonify, request
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+
+# Settings
+ENABLED = os.environ.get('FLASK_INSTRUMENTATION', '0') == '1'
+METRICS_PATH = os.environ.get('METRICS_PATH', '/metrics')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', './profiles')
+
+# Upper bounds (seconds) of the histogram buckets
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+# Stage timings of worker threads running a function wrapped with propagate_stages
+_worker = threading.local()
+
+
+def _get_timings() -> Optional[Dict[str, float]]:
+    """ Return the stage timings of the current request or worker thread, None if not recorded. """
+    if has_request_context():
+        return g.timings if 'timings' in g else None
+    return getattr(_worker, 'timings', None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Record the time spent in a block of code as a stage of the current request.
+    It does nothing if instrumentation is disabled or there is no request (e.g. threads that do
+    not run a function wrapped with propagate_stages).
+    """
+    timings = _get_timings()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def propagate_stages(function: Callable) -> Callable:
+    """
+    Wrap a function that a view runs in worker threads, so the stages recorded by the workers
+    are added to the timings of the request. Call it in the request thread.
+    """
+    timings = _get_timings()
+    if timings is None:
+        return function
+    lock = threading.Lock()
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        _worker.timings = {}
+        try:
+            return function(*args, **kwargs)
+        finally:
+            worker_timings = _worker.timings
+            del _worker.timings
+            with lock:
+                for name, seconds in worker_timings.items():
+                    timings[name] = timings.get(name, 0.0) + seconds
+
+    return wrapper
+
+
+class Histogram:
+    """ Cumulative latency histogram with fixed buckets. """
+    def __init__(self):
+        self.counts = [0] * len(HISTOGRAM_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': {str(bound): count for bound, count in zip(HISTOGRAM_BUCKETS, self.counts)}
+        }
+
+
+class Instrumentation:
+    """
+    Register instrumentation hooks and the metrics endpoint in a Flask application.
+    Usage: Instrumentation(app)
+    """
+    def __init__(self, app: Flask = None):
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        if not ENABLED:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule(METRICS_PATH, 'metrics', self.metrics)
+
+    def metrics(self):
+        """ Return latency histograms per endpoint and stage. """
+        with self._lock:
+            data: Dict[str, dict] = {}
+            for (endpoint, name), histogram in sorted(self._histograms.items()):
+                data.setdefault(endpoint, {})[name] = histogram.to_dict()
+        return jsonify(data)
+
+    def _before_request(self) -> None:
+        g.timings = {}
+        g.request_start = time.perf_counter()
+        g.profiler = None
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            try:
+                g.profiler = cProfile.Profile()
+                g.profiler.enable()
+            except ValueError:  # another request is already being profiled
+                g.profiler = None
+
+    def _after_request(self, response):
+        if 'request_start' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+
+        if g.profiler is not None:
+            g.profiler.disable()
+            if total >= SLOW_REQUEST_SECONDS:
+                self._dump_profile(g.profiler, total)
+
+        timings = dict(g.timings, total=total)
+        response.headers['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()
+        )
+
+        endpoint = request.endpoint or 'unknown'
+        if endpoint != 'metrics':
+            with self._lock:
+                for name, seconds in timings.items():
+                    self._histograms.setdefault((endpoint, name), Histogram()).observe(seconds)
+        return response
+
+    @staticmethod
+    def _dump_profile(profiler: cProfile.Profile, total: float) -> None:
+        """ Write the cProfile stats of a slow request to PROFILE_DIR. """
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        filename = (f"{time.strftime('%Y%m%dT%H%M%S')}_{request.endpoint}_"
+                    f"{int(total * 1000)}ms_{random.getrandbits(16):04x}.prof")
+        profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
@@ -1,12 +1,140 @@
 """
 This module contains the model implementation of a Park.
 """
+import numpy as np
 import pandas as pd
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Aggregations supported for production time series
+AGGREGATIONS = ('sum', 'mean', 'min', 'max', 'count')
+
+# Resampling frequencies that are computed once and reused by aggregate()
+ROLLUP_FREQUENCIES = ('1h', '1D', '7D', 'MS')
 
 
 class Park:
-    def __init__(self, name: str, timezone: str, energy_type: str, park_data_csv: str):
+    """
+    Production data of a park, stored as three columns sorted by local (wall clock) datetime:
+    timestamps (datetime64), datetimes (original datetime labels) and MW values.
+    Data can be loaded from a csv file or from the binary files created with ingest.py (one per
+    column), which are memory-mapped instead of parsed.
+    """
+    def __init__(self, name: str, timezone: str, energy_type: str, park_data_file: str):
         self.name: str = name
         self.timezone: str = timezone
         self.energy_type: str = energy_type
-        self.production = pd.read_csv(park_data_csv)
+
+        if park_data_file.endswith('.npy'):
+            self._load_binary(park_data_file)
+        else:
+            self._load_csv(park_data_file)
+
+        self._rollups: Dict[str, pd.DataFrame] = {}
+
+    def _load_csv(self, park_data_csv: str) -> None:
+        """ Parse a csv file with production data and sort it by datetime. """
+        production = pd.read_csv(park_data_csv)
+        timestamps = pd.to_datetime(production['datetime'].str[0:19])
+        order = timestamps.argsort(kind='mergesort')
+        self._timestamps = timestamps.values[order]
+        self._datetimes = production['datetime'].values[order]
+        self._mw = production['MW'].values[order]
+
+    def _load_binary(self, park_data_npy: str) -> None:
+        """ Memory-map the binary files with production columns, already sorted by datetime. """
+        self._timestamps = np.load(park_data_npy, mmap_mode='r')
+        self._datetimes = np.load(park_data_npy[:-len('.npy')] + '.datetime.npy', mmap_mode='r')
+        self._mw = np.load(park_data_npy[:-len('.npy')] + '.MW.npy', mmap_mode='r')
+        if not len(self._timestamps) == len(self._datetimes) == len(self._mw):
+            raise ValueError(f"Columns of {park_data_npy} have different lengths")
+
+    @property
+    def production(self) -> pd.DataFrame:
+        """ Return production data as a DataFrame with datetime and MW columns. """
+        return pd.DataFrame({'datetime': self._get_datetimes(0, len(self._timestamps)),
+                             'MW': self._mw})
+
+    def get_bounds(self, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Return the positions [lo, hi) of the production rows between two dates (both included).
+        :param start_date: initial date in the format YYYY-MM-DD
+        :param end_date: final date in the format YYYY-MM-DD
+        """
+        lo = 0
+        hi = len(self._timestamps)
+        if start_date:
+            lo = self._search(pd.Timestamp(start_date))
+        if end_date:
+            hi = self._search(pd.Timestamp(end_date) + pd.Timedelta(days=1))
+        return lo, max(lo, hi)
+
+    def get_production(self, lo: int, hi: int) -> List[Dict]:
+        """ Return production rows in positions [lo, hi) as a list of dictionaries. """
+        return [{'datetime': dt, 'MW': mw}
+                for dt, mw in zip(self._get_datetimes(lo, hi), self._mw[lo:hi].tolist())]
+
+    def get_cursor(self, position: int) -> List:
+        """
+        Return a cursor that points right after the production row in a given position.
+        The cursor stores the datetime of the row and how many rows with that same datetime have
+        already been returned (e.g. repeated hours when daylight saving time ends).
+        """
+        timestamp = pd.Timestamp(self._timestamps[position])
+        return [timestamp.isoformat(), position - self._search(timestamp) + 1]
+
+    def seek(self, cursor: List) -> int:
+        """ Return the position of the production row a cursor points to. """
+        timestamp, skip = cursor
+        return self._search(pd.Timestamp(timestamp)) + int(skip)
+
+    def iter_production(self, lo: int, hi: int, chunk_size: int = 10000) -> Iterator[Tuple]:
+        """
+        Yield production rows in positions [lo, hi) in chunks, as a tuple with a list of
+        datetimes and a list of MW values.
+        """
+        for chunk_lo in range(lo, hi, chunk_size):
+            chunk_hi = min(hi, chunk_lo + chunk_size)
+            yield self._get_datetimes(chunk_lo, chunk_hi), self._mw[chunk_lo:chunk_hi].tolist()
+
+    def aggregate(self, freq: str, aggregations: Sequence[str], lo: int, hi: int) -> List[Dict]:
+        """
+        Return production rows in positions [lo, hi) resampled to a given frequency.
+        Rollups of the whole production for ROLLUP_FREQUENCIES are computed once and reused.
+        :param freq: pandas frequency string (e.g. 1h, 1D, 7D, MS)
+        :param aggregations: aggregations to compute for every period, from AGGREGATIONS
+        :param lo: position of the first production row
+        :param hi: position after the last production row
+        :return: a list of dictionaries with the datetime of every period and its aggregations
+        """
+        if lo == 0 and hi == len(self._timestamps) and freq in ROLLUP_FREQUENCIES:
+            if freq not in self._rollups:
+                self._rollups[freq] = self._resample(freq, lo, hi)
+            resampled = self._rollups[freq]
+        else:
+            resampled = self._resample(freq, lo, hi)
+        resampled = resampled[list(aggregations)]
+
+        # Empty periods are returned as null values
+        resampled = resampled.astype(object).where(resampled.notna(), None)
+        return [{'datetime': period.isoformat(), **values}
+                for period, values in zip(resampled.index, resampled.to_dict('records'))]
+
+    def _resample(self, freq: str, lo: int, hi: int) -> pd.DataFrame:
+        """ Return all the AGGREGATIONS of production rows in positions [lo, hi) for a frequency. """
+        series = pd.Series(np.asarray(self._mw[lo:hi]),
+                           index=pd.DatetimeIndex(self._timestamps[lo:hi]))
+        return series.resample(freq).agg(list(AGGREGATIONS))
+
+    def _search(self, timestamp: pd.Timestamp) -> int:
+        """ Return the position of the first production row at or after a given timestamp. """
+        value = timestamp.to_datetime64().astype(self._timestamps.dtype)
+        return int(np.searchsorted(self._timestamps, value, side='left'))
+
+    def _get_datetimes(self, lo: int, hi: int) -> List[str]:
+        """ Return the datetime labels of production rows in positions [lo, hi). """
+        datetimes = self._datetimes[lo:hi]
+        if datetimes.dtype.kind == 'S':
+            datetimes = np.char.decode(datetimes, 'utf-8')
+        return datetimes.tolist()
@@ -1,32 +1,60 @@
 """
 This module contains a class implementation with to get and return data for every park.
 """
+import os
+import threading
+import numpy as np
 import pandas as pd
 from models.park import Park
+from typing import Optional, Tuple
 
 
 class Parks:
-    def __init__(self, park_info_csv: str):
-        self.park_info = pd.read_csv(park_info_csv)
+    def __init__(self, park_info_file: str):
+        if park_info_file.endswith('.npy'):
+            self.park_info = pd.DataFrame(np.load(park_info_file))
+        else:
+            self.park_info = pd.read_csv(park_info_file)
         self.park_list = [row['park_name'] for index, row in self.park_info.iterrows()]
         self._parks: dict = {}
+        self._versions: dict = {}
+        self._locks: dict = {}
 
-    def load_park(self, park_name: str, park_data_csv: str) -> None:
+    def load_park(self, park_name: str, park_data_file: str) -> None:
         """
-        Load data for a park.
+        Load data for a park. The park is only read again if its data file has changed.
+        It is safe to call it from several threads, every park is read only once.
         :param park_name: the name of the park
-        :param park_data_csv: csv file with production data
+        :param park_data_file: csv or binary (see ingest.py) file with production data
         """
-        for index, row in self.park_info.iterrows():
-            if park_name == row['park_name']:
-                try:
-                    self._parks[row['park_name']] = Park(
-                        row['park_name'], row['timezone'], row['energy_type'], park_data_csv
-                    )
-                except FileNotFoundError:
-                    print(f"Error, file {park_data_csv} not found")
-                except IOError:
-                    print(f"Error, file {park_data_csv} is not of csv type")
+        version = self.get_version(park_data_file)
+        if park_name in self._parks and version == self._versions.get(park_name):
+            return
+
+        with self._locks.setdefault(park_name, threading.Lock()):
+            if park_name in self._parks and version == self._versions.get(park_name):
+                return  # loaded by another thread meanwhile
+
+            for index, row in self.park_info.iterrows():
+                if park_name == row['park_name']:
+                    try:
+                        self._parks[row['park_name']] = Park(
+                            row['park_name'], row['timezone'], row['energy_type'], park_data_file
+                        )
+                        self._versions[row['park_name']] = version
+                    except FileNotFoundError:
+                        print(f"Error, file {park_data_file} not found")
+                    except (IOError, ValueError):
+                        print(f"Error, file {park_data_file} is not of csv or npy type")
+
+    @staticmethod
+    def get_version(park_data_file: str) -> Optional[Tuple[int, int]]:
+        """ Return the version of a data file (modification time and size), None if not found. """
+        try:
+            stat = os.stat(park_data_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
     def __getitem__(self, item: str):
         return self._parks[item]
@@ -1,20 +1,145 @@
+import os
+import json
+import base64
+import binascii
 import park_data
+import pandas as pd
+from cache import ResponseCache
+from instrumentation import propagate_stages, stage
 from flask_restful import Resource
-from flask import request, abort
-from typing import List
+from flask import request, abort, current_app, stream_with_context
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from models.park import Park, AGGREGATIONS
+
+
+# Input data (csv files and binary files created with ingest.py)
+INPUT_DIR = os.environ.get('PARKS_INPUT_DIR', './input')
+
+# Rows serialized at once when streaming NDJSON responses
+STREAM_CHUNK_SIZE = 10000
+
+# Max number of parks processed concurrently by ParksListAPI, shared by all requests
+# (1 processes parks sequentially)
+MAX_WORKERS = int(os.environ.get('PARKS_MAX_WORKERS', '4'))
+
+# Response cache limits
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+# Help functions
+def _input_file(name: str) -> str:
+    """
+    Return the path to an input data file. Binary files created with ingest.py are used when
+    they are up to date with their csv file.
+    """
+    csv_path = f'{INPUT_DIR}/{name}.csv'
+    npy_path = f'{INPUT_DIR}/{name}.npy'
+    try:
+        if os.stat(npy_path).st_mtime_ns >= os.stat(csv_path).st_mtime_ns:
+            return npy_path
+    except FileNotFoundError:
+        if os.path.exists(npy_path):
+            return npy_path
+    return csv_path
 
 
 # Parks object
-parks = park_data.Parks("./input/park_info.csv")
+parks = park_data.Parks(_input_file('park_info'))
+
+# Cache for serialized responses
+response_cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+
+# Thread pool to load, filter and serialize parks concurrently
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS) if MAX_WORKERS > 1 else None
+
+
+def cached(view: Callable) -> Callable:
+    """
+    Decorator for resource methods that serves responses from response_cache.
+    The cache key includes the normalized request arguments and the version of the data files
+    used to build the response, so a new data file invalidates previous responses.
+    Responses include an ETag, and requests with a matching If-None-Match get a 304.
+    NDJSON requests (negotiated with the Accept header) are never served from the cache.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if _wants_ndjson():
+            result = view(*args, **kwargs)
+            if isinstance(result, current_app.response_class):
+                result.vary.add('Accept')
+                return result  # streamed responses are not cached
+            return _json_response(*(result if isinstance(result, tuple) else (result, 200)))
 
+        park = kwargs.get('park')
+        park_names = [park.capitalize()] if park else parks.park_list
+        key = (
+            request.endpoint,
+            park.capitalize() if park else None,
+            tuple(sorted(request.args.items(multi=True))),
+            tuple(parks.get_version(_input_file(name)) for name in park_names)
+        )
 
-# Help function
-def _get_paginated_list(results: List, url_arg: str, start: str, limit: str) -> dict:
+        with stage('cache'):
+            entry = response_cache.get(key)
+        if entry is None:
+            result = view(*args, **kwargs)
+            data, status = result if isinstance(result, tuple) else (result, 200)
+            if status != 200:
+                return _json_response(data, status)
+            with stage('serialize'):
+                body = (json.dumps(data) + "\n").encode()
+            entry = response_cache.set(key, body), body
+
+        etag, body = entry
+        response = current_app.response_class(body, 200, mimetype='application/json')
+        response.vary.add('Accept')
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    return wrapper
+
+
+def _json_response(data: dict, status: int):
+    """ Return a JSON response that is not cached. """
+    with stage('serialize'):
+        body = (json.dumps(data) + "\n").encode()
+    response = current_app.response_class(body, status, mimetype='application/json')
+    response.vary.add('Accept')
+    return response
+
+
+def _invalid_dates_error(start_date: Optional[str], end_date: Optional[str]) -> Optional[tuple]:
+    """
+    Return a 400 error response if the date filters are used and one is not a valid date,
+    None otherwise.
     """
-    Returns a range of data from a list that is intended to be paginated for an API response.
+    if start_date and end_date:
+        for date in (start_date, end_date):
+            try:
+                pd.Timestamp(date)
+            except ValueError:
+                return {
+                    "error": {
+                        "code": 400,
+                        "message": f"Invalid date {date}. Use the format YYYY-MM-DD"
+                    }
+                }, 400
+    return None
+
+
+def _get_paginated_list(park: Park, lo: int, hi: int, url_arg: str, start: str,
+                        limit: str) -> dict:
+    """
+    Returns a range of production data from a park that is intended to be paginated for an API
+    response. Only the rows of the requested page are extracted.
     The start and limit parameters define the range of data that is returned.
 
-    :param results: a list of results to have paginated
+    :param park: a Park object whose production is paginated
+    :param lo: position of the first production row that matches the request
+    :param hi: position after the last production row that matches the request
     :param url_arg: based API url.
     :param start: page number (from 1 to the last value, e.g 1 to 99)
     :param limit: max number of results per page
@@ -23,7 +148,7 @@ def _get_paginated_list(results: List, url_arg: str, start: str, limit: str) ->
 
     start = int(start)
     limit = int(limit)
-    count = len(results)
+    count = hi - lo
 
     if count < start or limit < 0:
         abort(404)
@@ -46,57 +171,235 @@ def _get_paginated_list(results: List, url_arg: str, start: str, limit: str) ->
         response['next'] = f'{url_arg}?start={start_copy}&limit={limit}'
 
     # Extract result according to bounds
-    response['results'] = results[(start - 1):(start - 1 + limit)]
+    page_lo = lo + start - 1
+    response['results'] = park.get_production(page_lo, min(hi, page_lo + limit))
 
     return response
 
 
+def _encode_cursor(positions: Dict[str, List]) -> str:
+    """ Return an opaque cursor token from the positions reached for every park. """
+    return base64.urlsafe_b64encode(json.dumps(positions).encode()).decode()
+
+
+def _decode_cursor(token: str) -> Dict[str, List]:
+    """ Return the positions for every park stored in a cursor token (empty to start over). """
+    if not token:
+        return {}
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400)
+    if not isinstance(positions, dict):
+        abort(400)
+    return positions
+
+
+def _get_cursor_list(park: Park, lo: int, hi: int, position: Optional[List],
+                     limit: str) -> dict:
+    """
+    Returns a page of production data from a park, starting right after a given cursor position.
+    The page is located with a binary search, so its cost does not depend on how deep it is.
+
+    :param park: a Park object whose production is paginated
+    :param lo: position of the first production row that matches the request
+    :param hi: position after the last production row that matches the request
+    :param position: park position stored in the cursor (None to start from the first row)
+    :param limit: max number of results per page
+    :return: a dictionary with the response data
+    """
+    limit = int(limit)
+    if limit < 1:
+        abort(400)  # an empty page would point to the same cursor forever
+
+    try:
+        page_lo = max(lo, park.seek(position)) if position else lo
+    except (TypeError, ValueError):
+        abort(400)
+    page_hi = min(hi, page_lo + limit)
+
+    return {
+        'count': hi - lo,
+        'limit': limit,
+        'next': '',
+        'results': park.get_production(page_lo, page_hi),
+        # Internal values, replaced by the next URL in _set_cursor_links
+        'position': park.get_cursor(page_hi - 1) if page_hi > page_lo else position,
+        'exhausted': page_hi >= hi
+    }
+
+
+def _set_cursor_links(parks_data: List[dict], url_arg: str, start_date: Optional[str],
+                      end_date: Optional[str], limit: str) -> None:
+    """
+    Combine the positions reached by every park in a single cursor token and use it to build
+    the URL of the next page.
+
+    :param parks_data: park dictionaries returned by _get_park_data in cursor mode
+    :param url_arg: based API url.
+    :param start_date: filter for production datetimes (YYYY-MM-DD)
+    :param end_date: filter for production datetimes (YYYY-MM-DD)
+    :param limit: max number of results per page
+    """
+    positions = {}
+    exhausted = True
+    for data in parks_data:
+        production = data['production']
+        position = production.pop('position')
+        if position:
+            positions[data['park_name']] = position
+        exhausted = production.pop('exhausted') and exhausted
+
+    if exhausted:
+        return
+
+    next_url = f'{url_arg}?cursor={_encode_cursor(positions)}&limit={limit}'
+    if start_date and end_date:
+        next_url += f'&start_date={start_date}&end_date={end_date}'
+    for data in parks_data:
+        data['production']['next'] = next_url
+
+
+def _get_park_data(park_name: str, url_arg: str, start_date: Optional[str],
+                   end_date: Optional[str], start: str, limit: str,
+                   cursor: Optional[Dict[str, List]] = None) -> dict:
+    """
+    Load a park and return its data with the production paginated.
+    If a cursor is given, keyset pagination is used instead of start (page number).
+
+    :param park_name: the name of the park
+    :param url_arg: based API url.
+    :param start_date: filter for production datetimes (YYYY-MM-DD)
+    :param end_date: filter for production datetimes (YYYY-MM-DD)
+    :param start: page number
+    :param limit: max number of results per page
+    :param cursor: decoded cursor token with the position reached for every park
+    :return: a dictionary with the park data
+    """
+    # Load park data
+    with stage('load'):
+        parks.load_park(park_name, _input_file(park_name))
+    park = parks[park_name]
+
+    # Get park production bounds
+    with stage('filter'):
+        if start_date and end_date:
+            lo, hi = park.get_bounds(start_date, end_date)
+        else:
+            lo, hi = park.get_bounds()
+
+    if cursor is not None:
+        with stage('paginate'):
+            production = _get_cursor_list(park, lo, hi, cursor.get(park_name), limit)
+    elif hi > lo:
+        with stage('paginate'):
+            production = _get_paginated_list(park, lo, hi, url_arg, start, limit)
+    else:
+        production = {
+            "count": 0,
+            "limit": limit,
+            "start": start,
+            "previous": "",
+            "next": "",
+            "results": []
+        }
+
+    return {
+        'park_name': park_name,
+        'timezone': park.timezone,
+        'energy_type': park.energy_type,
+        'production': production
+    }
+
+
+def _wants_ndjson() -> bool:
+    """ Return True if the request asks for a streamed NDJSON response. """
+    return (request.args.get('format') == 'ndjson' or
+            request.accept_mimetypes.best == 'application/x-ndjson')
+
+
+def _stream_production(park_names: List[str], start_date: Optional[str],
+                       end_date: Optional[str], start: str, limit: str):
+    """
+    Return a streamed NDJSON response with one line per production row of the given parks.
+    Rows are serialized in chunks straight from the production columns, so the full response
+    is never built in memory.
+
+    :param park_names: names of the parks to export
+    :param start_date: filter for production datetimes (YYYY-MM-DD)
+    :param end_date: filter for production datetimes (YYYY-MM-DD)
+    :param start: first row to export for every park (from 1)
+    :param limit: max number of rows to export for every park
+    :return: a streamed response
+    """
+    start = int(start)
+    limit = int(limit)
+    if start < 1 or limit < 0:
+        abort(404)
+
+    def generate():
+        for park_name in park_names:
+            parks.load_park(park_name, _input_file(park_name))
+            park = parks[park_name]
+            if start_date and end_date:
+                lo, hi = park.get_bounds(start_date, end_date)
+            else:
+                lo, hi = park.get_bounds()
+            page_lo = lo + start - 1
+            page_hi = min(hi, page_lo + limit)
+
+            prefix = '{"park_name": ' + json.dumps(park_name) + ', "datetime": '
+            for datetimes, values in park.iter_production(page_lo, page_hi, STREAM_CHUNK_SIZE):
+                yield ''.join(
+                    f'{prefix}{json.dumps(dt)}, "MW": {json.dumps(mw)}}}\n'
+                    for dt, mw in zip(datetimes, values)
+                )
+
+    return current_app.response_class(stream_with_context(generate()),
+                                      mimetype='application/x-ndjson')
+
 
 class ParksListAPI(Resource):
-    def get(self):
-        response_data = []
+    method_decorators = [cached]
 
+    def get(self):
         # Request arguments (we are not validating data in this practice)
         start_date_arg = request.args.get('start_date')   # filter for production datetimes
         end_date_arg = request.args.get('end_date')       # filter for production datetimes
         start_arg = request.args.get('start', '1')    # initial value for pagination
         limit_arg = request.args.get('limit', '100')  # set the max number of rows
+        cursor_arg = request.args.get('cursor')       # keyset pagination (empty to start)
+
+        error = _invalid_dates_error(start_date_arg, end_date_arg)
+        if error:
+            return error
+
+        if _wants_ndjson():
+            return _stream_production(parks.park_list, start_date_arg, end_date_arg, start_arg,
+                                      limit_arg)
+
+        cursor = _decode_cursor(cursor_arg) if cursor_arg is not None else None
 
-        for park in parks.park_list:
-            # Load park data
-            parks.load_park(park, f'./input/{park}.csv')
+        @propagate_stages
+        def get_park_data(park: str) -> dict:
+            return _get_park_data(park, "/parks", start_date_arg, end_date_arg, start_arg,
+                                  limit_arg, cursor)
 
-            # Get park production
-            if start_date_arg and end_date_arg:
-                park_production = ([{'datetime': row['datetime'], 'MW': row['MW']}
-                                    for index, row in parks[park].production.iterrows()
-                                    if start_date_arg <= row['datetime'][0:10] <= end_date_arg])
+        # Parks are processed in the thread pool, results are kept in park_list order
+        with stage('parks'):
+            if executor:
+                response_data = list(executor.map(get_park_data, parks.park_list))
             else:
-                park_production = [
-                    {'datetime': row['datetime'],
-                     'MW': row['MW']} for index, row in parks[park].production.iterrows()]
-
-            response_data.append({
-                    'park_name': park,
-                    'timezone': parks[park].timezone,
-                    'energy_type': parks[park].energy_type,
-                    'production': (
-                        _get_paginated_list(park_production, "/parks", start_arg, limit_arg)
-                        if park_production else {
-                            "count": 0,
-                            "limit": limit_arg,
-                            "start": start_arg,
-                            "previous": "",
-                            "next": "",
-                            "results": []
-                        }
-                    )
-            })
+                response_data = [get_park_data(park) for park in parks.park_list]
+        if cursor is not None:
+            _set_cursor_links(response_data, "/parks", start_date_arg, end_date_arg, limit_arg)
 
         return {'parks': response_data}, 200
 
 
 class ParkAPI(Resource):
+    method_decorators = [cached]
+
     def get(self, park: str):
         # Capitalize park arg for compatibility
         park = park.capitalize()
@@ -106,39 +409,24 @@ class ParkAPI(Resource):
         end_date_arg = request.args.get('end_date')
         start_arg = request.args.get('start', '1')
         limit_arg = request.args.get('limit', '100')
+        cursor_arg = request.args.get('cursor')
 
         if park in parks.park_list:
-            # Load park data
-            parks.load_park(park, f'./input/{park}.csv')
-
-            # Get park production
-            if start_date_arg and end_date_arg:
-                park_production = ([{'datetime': row['datetime'], 'MW': row['MW']}
-                                    for index, row in parks[park].production.iterrows()
-                                    if start_date_arg <= row['datetime'][0:10] <= end_date_arg])
-            else:
-                park_production = [
-                    {'datetime': row['datetime'],
-                     'MW': row['MW']} for index, row in parks[park].production.iterrows()
-                ]
-
-            response_data = {
-                'park_name': park,
-                'timezone': parks[park].timezone,
-                'energy_type': parks[park].energy_type,
-                'production': (
-                    _get_paginated_list(park_production, "/parks", start_arg, limit_arg)
-                    if park_production else {
-                        "count": 0,
-                        "limit": limit_arg,
-                        "start": start_arg,
-                        "previous": "",
-                        "next": "",
-                        "results": []
-                    }
-                )
-            }
+            error = _invalid_dates_error(start_date_arg, end_date_arg)
+            if error:
+                return error
+
+            if _wants_ndjson():
+                return _stream_production([park], start_date_arg, end_date_arg, start_arg,
+                                          limit_arg)
 
+            cursor = _decode_cursor(cursor_arg) if cursor_arg is not None else None
+            response_data = _get_park_data(
+                park, f"/{park}", start_date_arg, end_date_arg, start_arg, limit_arg, cursor
+            )
+            if cursor is not None:
+                _set_cursor_links([response_data], f"/{park}", start_date_arg, end_date_arg,
+                                  limit_arg)
             return {'park': response_data}, 200
 
         else:
@@ -148,3 +436,71 @@ class ParkAPI(Resource):
                     "message": "Park not found"
                 }
             }
+
+
+class ParkAggregateAPI(Resource):
+    method_decorators = [cached]
+
+    def get(self, park: str):
+        # Capitalize park arg for compatibility
+        park = park.capitalize()
+
+        # Request arguments
+        start_date_arg = request.args.get('start_date')
+        end_date_arg = request.args.get('end_date')
+        freq_arg = request.args.get('freq', '1D')          # pandas frequency string
+        agg_arg = request.args.get('agg', 'sum,mean,max')  # comma separated aggregations
+
+        aggregations = [agg.strip() for agg in agg_arg.split(',') if agg.strip()]
+        if not aggregations or any(agg not in AGGREGATIONS for agg in aggregations):
+            return {
+                "error": {
+                    "code": 400,
+                    "message": f"Invalid aggregation. Valid options: {', '.join(AGGREGATIONS)}"
+                }
+            }, 400
+
+        if park not in parks.park_list:
+            return {
+                "error": {
+                    "code": 404,
+                    "message": "Park not found"
+                }
+            }
+
+        error = _invalid_dates_error(start_date_arg, end_date_arg)
+        if error:
+            return error
+
+        # Load park data
+        with stage('load'):
+            parks.load_park(park, _input_file(park))
+        park_obj = parks[park]
+
+        if start_date_arg and end_date_arg:
+            lo, hi = park_obj.get_bounds(start_date_arg, end_date_arg)
+        else:
+            lo, hi = park_obj.get_bounds()
+
+        try:
+            with stage('aggregate'):
+                results = park_obj.aggregate(freq_arg, aggregations, lo, hi)
+        except ValueError:
+            return {
+                "error": {
+                    "code": 400,
+                    "message": f"Invalid frequency {freq_arg}"
+                }
+            }, 400
+
+        response_data = {
+            'park_name': park,
+            'timezone': park_obj.timezone,
+            'energy_type': park_obj.energy_type,
+            'freq': freq_arg,
+            'aggregations': aggregations,
+            'count': len(results),
+            'results': results
+        }
+
+        return {'park': response_data}, 200
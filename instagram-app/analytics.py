@@ -0,0 +1,52 @@
+"""
+Streaming analytics of Instagram posts: every post is consumed once and then discarded, so memory
+does not grow with the number of posts of an account.
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Tuple
+
+
+class PostAnalytics:
+    """
+    Statistics of a stream of posts (instaloader.Post or cache.PostRecord), computed in one pass:
+        -the top k liked posts, kept in a min-heap of size k
+        -number of posts, likes, videos and photos per month (YYYY-MM)
+    :param top_k: number of top liked posts to keep
+    """
+    def __init__(self, top_k: int = 0):
+        self.top_k = max(0, top_k)
+        self.monthly: Dict[str, Dict[str, int]] = {}
+        self._heap: List[Tuple[int, int, str]] = []  # (likes, -position, shortcode)
+        self._count = 0
+
+    def add(self, post) -> None:
+        """ Add a post to the statistics """
+        # On equal likes, the post seen first (the newest one) ranks higher
+        item = (post.likes, -self._count, post.shortcode)
+        self._count += 1
+        if len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, item)
+        elif self.top_k and item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+        stats = self.monthly.setdefault(f"{post.date:%Y-%m}",
+                                        {'posts': 0, 'likes': 0, 'videos': 0, 'photos': 0})
+        stats['posts'] += 1
+        stats['likes'] += post.likes
+        stats['videos' if post.is_video else 'photos'] += 1
+
+    def consume(self, posts: Iterable) -> 'PostAnalytics':
+        """ Add all the posts of an iterable and return self """
+        for post in posts:
+            self.add(post)
+        return self
+
+    def top_liked(self) -> Dict[str, int]:
+        """ Return the shortcode and likes of the top k liked posts, from most to least liked """
+        return {shortcode: likes for likes, _, shortcode in sorted(self._heap, reverse=True)}
+
+    def monthly_stats(self) -> List[Tuple[str, Dict[str, float]]]:
+        """ Return the statistics per month (including average likes per post), oldest first """
+        return [(month, dict(stats, avg_likes=stats['likes'] / stats['posts']))
+                for month, stats in sorted(self.monthly.items())]
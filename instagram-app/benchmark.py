@@ -0,0 +1,190 @@
+"""
+Offline benchmark of InstagramClient.
+It builds synthetic accounts (followers, followees and posts) and injects them into the client
+instead of instaloader profiles, then measures:
+    -diff      -> difference of followers-followees
+    -top_k     -> top liked posts (and monthly statistics, same pass)
+    -download  -> post downloads through the download manager, with a simulated download latency
+With --fixtures, diff and top_k run instead against the HTTP responses and profile recorded with
+replay.Recorder, for the account of --username, without connecting to Instagram.
+
+Usage examples:
+    python benchmark.py
+    python benchmark.py --sizes 1000,100000 --top-k 50 --page-latency 0.01
+    python benchmark.py --download-posts 500 --workers 8 --download-latency 0.05
+    python benchmark.py --fixtures ./fixtures --username my_user --page-latency 0.2
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import instaloader
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, Iterator, List
+
+from cache import PostRecord
+from client import InstagramClient
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# Items per page of the synthetic feeds, as in instaloader GraphQL pages
+PAGE_LENGTH = 12
+
+
+class FakeProfile:
+    """
+    Synthetic account with n followers, n followees (half of them following back) and n posts.
+    :param n: number of followers, followees and posts
+    :param page_latency: seconds to wait before every page of a feed
+    """
+    def __init__(self, n: int, page_latency: float = 0.0):
+        self.page_latency = page_latency
+        self._followers = [f"user{i}" for i in range(n)]
+        self._followees = [f"user{i}" for i in range(n // 2, n // 2 + n)]
+        newest = datetime(2024, 1, 1)
+        self._posts = [PostRecord(f"post{i}", newest - timedelta(hours=6 * i),
+                                  random.randint(0, 10000), random.random() < 0.2)
+                       for i in range(n)]
+
+    def get_followers(self) -> Iterator[SimpleNamespace]:
+        return self._paginate(SimpleNamespace(username=u) for u in self._followers)
+
+    def get_followees(self) -> Iterator[SimpleNamespace]:
+        return self._paginate(SimpleNamespace(username=u) for u in self._followees)
+
+    def get_posts(self) -> Iterator[PostRecord]:
+        return self._paginate(iter(self._posts))
+
+    def _paginate(self, items: Iterator) -> Iterator:
+        """ Yield items, waiting page_latency before every page """
+        for i, item in enumerate(items):
+            if self.page_latency and i % PAGE_LENGTH == 0:
+                time.sleep(self.page_latency)
+            yield item
+
+
+class FakeLoader:
+    """
+    Instaloader stand-in whose downloads only wait.
+    :param download_latency: seconds to download a post
+    """
+    def __init__(self, download_latency: float = 0.0):
+        self.context = None
+        self.download_latency = download_latency
+
+    def download_post(self, post, target: str) -> bool:
+        time.sleep(self.download_latency)
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class NoRateController(instaloader.RateController):
+    """ Rate controller of instaloader that never waits before a query """
+    def wait_before_query(self, query_type: str) -> None:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """ Return the peak resident set size of this process in MB, or nan if unavailable. """
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(name: str, size: int, run: Callable[[InstagramClient], object],
+            make_client: Callable[[], InstagramClient], repeat: int) -> None:
+    """
+    Print the best time of several runs (every run with a new client, so nothing is memoized).
+    :param name: benchmark name
+    :param size: number of items processed per run
+    :param run: function that runs the benchmark with a client
+    :param make_client: function that returns a new client
+    :param repeat: number of runs
+    """
+    timings: List[float] = []
+    for _ in range(repeat):
+        client = make_client()
+        start = time.perf_counter()
+        run(client)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{name:<10} {size:>9} {best * 1000:>11.2f} {size / best:>12.1f}")
+
+
+def main(args: argparse.Namespace) -> None:
+    random.seed(args.seed)
+    print(f"{'benchmark':<10} {'items':>9} {'best ms':>11} {'items/s':>12}")
+
+    if args.fixtures:
+        from replay import Replayer
+        # Replays are not throttled by instaloader, only delayed by --page-latency
+        loader = instaloader.Instaloader(quiet=True, sleep=False,
+                                         rate_controller=NoRateController)
+        loader.context.username = args.username  # the user whose session was recorded
+        with Replayer(loader.context, args.fixtures, latency=args.page_latency) as replayer:
+            def make_client() -> InstagramClient:
+                return InstagramClient(args.username, loader=loader,
+                                       profile=replayer.load_profile())
+            client = make_client()
+            followers = len(client.followers) + len(client.followees)
+            posts = sum(1 for _ in client.iter_posts())
+            measure('diff', followers, lambda c: c.get_difference_followers_followees(),
+                    make_client, args.repeat)
+            measure('top_k', posts, lambda c: c.get_post_analytics(args.top_k),
+                    make_client, args.repeat)
+    else:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            profile = FakeProfile(size, args.page_latency)
+
+            def make_client() -> InstagramClient:
+                return InstagramClient('benchmark', loader=FakeLoader(), profile=profile)
+            measure('diff', 2 * size, lambda c: c.get_difference_followers_followees(),
+                    make_client, args.repeat)
+            measure('top_k', size, lambda c: c.get_post_analytics(args.top_k),
+                    make_client, args.repeat)
+
+    # Downloads go to a temporary directory, with a new manifest every run
+    os.chdir(tempfile.mkdtemp(prefix='instagram_benchmark_'))
+    profile = FakeProfile(args.download_posts)
+    runs = iter(range(args.repeat))
+
+    def make_download_client() -> InstagramClient:
+        return InstagramClient(f'download{next(runs)}', loader=FakeLoader(args.download_latency),
+                               profile=profile, download_workers=args.workers)
+    measure('download', args.download_posts,
+            lambda c: c.download_user_posts('1970/01/01', '2100/01/01'),
+            make_download_client, args.repeat)
+
+    print(f"Peak RSS: {peak_rss_mb():.1f} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark InstagramClient offline.")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="comma separated number of followers and posts of the accounts")
+    parser.add_argument('--top-k', type=int, default=10, help="number of top liked posts")
+    parser.add_argument('--page-latency', type=float, default=0.0,
+                        help="seconds to wait before every page (or recorded response)")
+    parser.add_argument('--download-posts', type=int, default=200, help="posts to download")
+    parser.add_argument('--download-latency', type=float, default=0.01,
+                        help="seconds to download a post")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent downloads")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark")
+    parser.add_argument('--fixtures', help="directory of recorded responses (see replay.py)")
+    parser.add_argument('--username', help="account of the recorded responses")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    arguments = parser.parse_args()
+    if arguments.fixtures and not arguments.username:
+        parser.error("--fixtures requires --username")
+    main(arguments)
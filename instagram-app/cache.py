@@ -0,0 +1,123 @@
+"""
+Local SQLite cache of Instagram metadata: posts (shortcode, date, likes, is_video) and
+relationship lists (followers, followees) of every account.
+Every list has a sync time, so it is only fetched again from Instagram when it is older than the
+cache TTL.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple, Optional, Set
+
+
+class PostRecord(NamedTuple):
+    """ Metadata of a post, as stored in the cache """
+    shortcode: str
+    date: datetime
+    likes: int
+    is_video: bool
+
+    @classmethod
+    def from_post(cls, post) -> 'PostRecord':
+        """ Return the record of an instaloader.Post """
+        return cls(post.shortcode, post.date, post.likes, post.is_video)
+
+
+class MetadataCache:
+    """
+    Cache of posts and relationship lists per account, stored in a SQLite file.
+    :param path: path to the SQLite file
+    :param ttl: seconds before cached data is considered outdated
+    """
+    def __init__(self, path: str, ttl: float = 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS posts (owner TEXT, shortcode TEXT, date TEXT, "
+                       "likes INTEGER, is_video INTEGER, PRIMARY KEY (owner, shortcode))")
+            db.execute("CREATE INDEX IF NOT EXISTS posts_by_date ON posts (owner, date)")
+            db.execute("CREATE TABLE IF NOT EXISTS relationships (owner TEXT, kind TEXT, "
+                       "username TEXT, PRIMARY KEY (owner, kind, username))")
+            db.execute("CREATE TABLE IF NOT EXISTS syncs (owner TEXT, kind TEXT, synced REAL, "
+                       "PRIMARY KEY (owner, kind))")
+
+    def is_fresh(self, owner: str, kind: str) -> bool:
+        """ Return True if a list (posts, followers, followees) was synced within the TTL """
+        with self._connect() as db:
+            row = db.execute("SELECT synced FROM syncs WHERE owner = ? AND kind = ?",
+                             (owner, kind)).fetchone()
+        return row is not None and time.time() - row[0] < self.ttl
+
+    def mark_synced(self, owner: str, kind: str) -> None:
+        """ Set the sync time of a list to now """
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)", (owner, kind, time.time()))
+
+    def get_posts(self, owner: str) -> Iterator[PostRecord]:
+        """ Yield the cached posts of an account, newest first, reading them one at a time """
+        with self._connect() as db:
+            rows = db.execute("SELECT shortcode, date, likes, is_video FROM posts WHERE owner = ? "
+                              "ORDER BY date DESC", (owner,))
+            for shortcode, date, likes, is_video in rows:
+                yield PostRecord(shortcode, datetime.fromisoformat(date), likes, bool(is_video))
+
+    def get_shortcodes(self, owner: str) -> Set[str]:
+        """ Return the shortcodes of the cached posts of an account """
+        with self._connect() as db:
+            rows = db.execute("SELECT shortcode FROM posts WHERE owner = ?", (owner,)).fetchall()
+        return {shortcode for shortcode, in rows}
+
+    def add_posts(self, owner: str, posts: Iterable[PostRecord]) -> None:
+        """ Store (or update) posts of an account """
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?)",
+                ((owner, p.shortcode, p.date.isoformat(), p.likes, int(p.is_video)) for p in posts)
+            )
+
+    def replace_posts(self, owner: str, posts: Iterable[PostRecord],
+                      since: Optional[datetime] = None) -> None:
+        """
+        Store (or update) posts of an account, removing the cached posts published since a date
+        that are not among them (e.g. deleted from Instagram).
+        :param since: date from which posts are replaced, None to replace all the posts
+        """
+        with self._connect() as db:
+            if since is None:
+                db.execute("DELETE FROM posts WHERE owner = ?", (owner,))
+            else:
+                db.execute("DELETE FROM posts WHERE owner = ? AND date >= ?",
+                           (owner, since.isoformat()))
+            db.executemany(
+                "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?)",
+                ((owner, p.shortcode, p.date.isoformat(), p.likes, int(p.is_video)) for p in posts)
+            )
+
+    def get_relationships(self, owner: str, kind: str) -> Optional[Set[str]]:
+        """ Return a cached relationship list (followers, followees), None if it is outdated """
+        if not self.is_fresh(owner, kind):
+            return None
+        with self._connect() as db:
+            rows = db.execute("SELECT username FROM relationships WHERE owner = ? AND kind = ?",
+                              (owner, kind)).fetchall()
+        return {username for username, in rows}
+
+    def set_relationships(self, owner: str, kind: str, usernames: Iterable[str]) -> None:
+        """ Replace a relationship list (followers, followees) and mark it as synced """
+        with self._connect() as db:
+            db.execute("DELETE FROM relationships WHERE owner = ? AND kind = ?", (owner, kind))
+            db.executemany("INSERT INTO relationships VALUES (?, ?, ?)",
+                           ((owner, kind, username) for username in usernames))
+        self.mark_synced(owner, kind)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """ Open the SQLite file, commit the transaction and close it """
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
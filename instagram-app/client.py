@@ -3,12 +3,19 @@ See more functionality examples: https://instaloader.github.io/codesnippets.html
 
 """
 
-import numpy as np
 import instaloader
-import heapq
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from itertools import takewhile
-from typing import Optional, List, Dict
+from typing import Optional, Iterator, List, Dict, Set
+from analytics import PostAnalytics
+from cache import MetadataCache, PostRecord
+from downloader import DownloadManager
+from scanner import HashtagScanner
+
+
+# Known posts found in a row before a post sync stops (pinned posts come first, out of order)
+PINNED_POSTS = 3
 
 
 class InstagramClient:
@@ -16,14 +23,28 @@ class InstagramClient:
     A client to connect to Instagram and perform different operations using instaloader API.
     It requires a username to log in.
     """
-    def __init__(self, username: str, session_file: Optional[str] = None):
+    def __init__(self, username: str, session_file: Optional[str] = None,
+                 loader: Optional[instaloader.Instaloader] = None,
+                 profile: Optional[instaloader.Profile] = None, cache_file: Optional[str] = None,
+                 cache_ttl: float = 24 * 3600, cache_refresh_age: float = 7 * 24 * 3600,
+                 download_workers: int = 4):
         self.username = username
         self.session_file = session_file
-        self._loader = instaloader.Instaloader()  # Instance of Instaloader class
+        # Local metadata cache, so repeated analyses run from disk
+        self._cache = MetadataCache(cache_file, ttl=cache_ttl) if cache_file else None
+        # Posts younger than this (in seconds) get their likes fetched again on every sync
+        self.cache_refresh_age = cache_refresh_age
+        self._loader = loader or instaloader.Instaloader()  # Instance of Instaloader class
         self._context = self._loader.context      # low-level communication with Instagram
-        self._profile = instaloader.Profile.from_username(self._context, username=username)
+        self._downloader = DownloadManager(self._loader, max_workers=download_workers)
+        self._profile = profile or instaloader.Profile.from_username(self._context,
+                                                                     username=username)
+        # Followers and followees are fetched once per session
+        self._followers: Optional[Set[str]] = None
+        self._followees: Optional[Set[str]] = None
 
     def login(self) -> None:
+        self.clear_cache()
         if self.session_file:
             try:
                 self._login_with_sessionfile(self.session_file)
@@ -56,42 +77,113 @@ class InstagramClient:
 
     def close_session(self) -> None:
         """ Close instagram session"""
+        self.clear_cache()
         self._loader.close()
 
+    def clear_cache(self) -> None:
+        """ Forget followers and followees, so they are fetched again """
+        self._followers = None
+        self._followees = None
+
     @property
-    def followers(self):
+    def followers(self) -> Set[str]:
         """ Return username followers """
-        return np.array([f.username for f in self._profile.get_followers()])
+        if self._followers is None:
+            self._followers = self._get_relationships('followers', self._profile.get_followers)
+        return self._followers
 
     @property
-    def followees(self):
+    def followees(self) -> Set[str]:
         """ Return username followees """
-        return np.array([f.username for f in self._profile.get_followees()])
+        if self._followees is None:
+            self._followees = self._get_relationships('followees', self._profile.get_followees)
+        return self._followees
+
+    def _get_relationships(self, kind: str, get_profiles) -> Set[str]:
+        """
+        Return a relationship list from the cache, or fetch it from Instagram if it is outdated.
+        :param kind: followers or followees
+        :param get_profiles: Profile method that iterates the list
+        """
+        if self._cache is not None:
+            usernames = self._cache.get_relationships(self.username, kind)
+            if usernames is not None:
+                return usernames
+        usernames = {f.username for f in get_profiles()}
+        if self._cache is not None:
+            self._cache.set_relationships(self.username, kind, usernames)
+        return usernames
+
+    def fetch_relationships(self) -> None:
+        """ Fetch followers and followees concurrently, if they are not fetched yet """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            followers = executor.submit(lambda: self.followers)
+            followees = executor.submit(lambda: self.followees)
+            followers.result()
+            followees.result()
 
     def get_difference_followers_followees(self, ignore: Optional[List[str]] = None) -> List[str]:
         """
-        Return the difference between user followers and followees.
-        :param ignore -> path to file with accounts to be ignored when comparing
+        Return the difference between user followers and followees (sorted by username).
+        :param ignore -> accounts to be ignored when comparing
         """
-        difference_followers_followees = np.setdiff1d(self.followees, self.followers)
-        if not ignore:
-            return [user for user in difference_followers_followees]
-        return [user for user in difference_followers_followees if user not in ignore]
+        self.fetch_relationships()
+        return sorted(self.followees - self.followers - set(ignore or ()))
+
+    def iter_posts(self) -> Iterator[PostRecord]:
+        """
+        Yield the metadata of the user posts.
+        With a cache, posts are read from disk (newest first). Once the cache is outdated, it is
+        synced with the posts published since the last sync and the ones younger than
+        cache_refresh_age, so likes of older posts are the ones they had when they were last
+        fetched.
+        """
+        if self._cache is None:
+            for post in self._profile.get_posts():
+                yield PostRecord.from_post(post)
+            return
+        if not self._cache.is_fresh(self.username, 'posts'):
+            self._sync_posts()
+        yield from self._cache.get_posts(self.username)
+
+    def _sync_posts(self) -> None:
+        """
+        Fetch the user posts newest first and store them, updating the cached ones.
+        The sync walks all the posts younger than cache_refresh_age, and stops afterwards when it
+        finds known posts in a row. Cached posts that were not found in the walked range are
+        removed (deleted from Instagram).
+        """
+        known = self._cache.get_shortcodes(self.username)
+        refresh_since = datetime.now() - timedelta(seconds=self.cache_refresh_age)
+        posts = []
+        since = None  # date of the last post walked, None if all the posts were walked
+        known_in_a_row = 0
+        for post in self._profile.get_posts():
+            posts.append(PostRecord.from_post(post))
+            if post.shortcode in known and post.date < refresh_since:
+                known_in_a_row += 1
+                if known_in_a_row > PINNED_POSTS:
+                    since = post.date
+                    break
+            else:
+                known_in_a_row = 0
+        self._cache.replace_posts(self.username, posts, since)
+        self._cache.mark_synced(self.username, 'posts')
+
+    def get_post_analytics(self, top_k: int = 0) -> PostAnalytics:
+        """
+        Return the analytics of the user posts (top liked posts and monthly statistics), computed
+        in a single pass over the posts.
+        :param top_k: number of top liked posts to keep
+        """
+        return PostAnalytics(top_k).consume(self.iter_posts())
 
     def get_top_liked_posts(self, max_posts: int) -> Dict:
         """
         Return a Dict with the number of likes and post url for the top n liked post.
         :param max_posts: maximum number of posts to return
         """
-        top_n_likes = {}
-        posts = {f.shortcode: f.likes for f in self._profile.get_posts()}
-        # Order likes from top to bottom
-        lst = heapq.nlargest(max_posts, [like for shortcode, like in posts.items()])
-        sorted_dict = sorted(posts.items(), key=lambda item: item[1], reverse=True)
-        # Save and return results
-        for element in [(key, value) for key, value in sorted_dict if value in lst]:
-            top_n_likes[element[0]] = element[1]
-        return top_n_likes
+        return self.get_post_analytics(top_k=max_posts).top_liked()
 
     def download_user_posts(self, start_date: str, end_date: str, username: Optional[str] = None,
                             download_video: bool = True) -> None:
@@ -114,13 +206,10 @@ class InstagramClient:
             print(f"Downloading posts from user {username}...")
             try:
                 # takewhile selects values from iterator that fulfill a given condition
-                for post in takewhile(
-                        lambda p: start_date <= p.date <= end_date, profile.get_posts()
-                ):
-                    if download_video:
-                        self._loader.download_post(post, username)
-                    if not post.is_video:
-                        self._loader.download_post(post, username)
+                posts = takewhile(lambda p: start_date <= p.date <= end_date, profile.get_posts())
+                self._download(
+                    (post for post in posts if download_video or not post.is_video), username
+                )
             except instaloader.PrivateProfileNotFollowedException:
                 print(f"Error, you can't access user {username} profile.")
         except Exception as e:
@@ -135,30 +224,24 @@ class InstagramClient:
         :param end_date: end date to download posts
         :param download_video: if True, download also videos
         """
-        profile = instaloader.Hashtag.from_name(self._context, hashtag)
         start_date = self._convert_str_datetime(start_date)
         end_date = self._convert_str_datetime(end_date)
-
-        # See https://instaloader.github.io/codesnippets.html for detailed explanation of the
-        # following logic
-        k = 0  # initiate k
-        # k_list = []  # uncomment this to tune k
-
-        for post in profile.get_posts():
-            postdate = post.date
-            if postdate > end_date:
-                continue
-            elif postdate <= start_date:
-                k += 1
-                if k == 50:
-                    break
-                else:
-                    continue
-            else:
-                if download_video:
-                    self._loader.download_post(post, hashtag)
-                if not post.is_video:
-                    self._loader.download_post(post, hashtag)
+        if start_date is None or end_date is None:
+            raise ValueError("Invalid date. Use the format YYYY/MM/DD")
+
+        # The scanner keeps an index of the hashtag feed in the download directory, to stop early
+        # and to resume later scans (see https://instaloader.github.io/codesnippets.html)
+        scanner = HashtagScanner(instaloader.Hashtag.from_name(self._context, hashtag), hashtag)
+        self._download(
+            (post for post in scanner.scan(start_date, end_date)
+             if download_video or not post.is_video), hashtag
+        )
+
+    def _download(self, posts, target: str) -> None:
+        """ Download posts into the target directory and print a summary """
+        counts = self._downloader.download(posts, target)
+        print(f"{counts['downloaded']} posts downloaded into {target} "
+              f"({counts['skipped']} already downloaded, {counts['failed']} failed).")
 
     @staticmethod
     def _convert_str_datetime(date: str) -> datetime:
@@ -0,0 +1,121 @@
+"""
+Concurrent and resumable download of posts with instaloader.
+Every target directory has a manifest file with the shortcodes of the posts already downloaded,
+so an interrupted download skips them when it is run again.
+"""
+
+import os
+import time
+import threading
+import instaloader
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Set
+
+
+# File with the shortcodes of the downloaded posts, inside the target directory
+MANIFEST_FILE = '.downloaded'
+
+
+class DownloadManager:
+    """
+    Download posts through a bounded thread pool.
+    Posts are consumed lazily from the iterator, with at most two posts per worker waiting, and
+    downloads failed by connection errors (e.g. rate limiting) are retried with exponential backoff.
+    The backoff is shared by the pool: after a connection error, no worker sends requests until it
+    has passed.
+    :param loader: Instaloader instance used to download
+    :param max_workers: number of concurrent downloads
+    :param max_retries: retries of a post after a connection error
+    :param backoff: seconds to wait before the first retry, doubled on every retry
+    """
+    def __init__(self, loader: instaloader.Instaloader, max_workers: int = 4, max_retries: int = 5,
+                 backoff: float = 10.0):
+        self._loader = loader
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._resume_at = 0.0  # time.monotonic() before which no download starts
+        self._resume_lock = threading.Lock()
+
+    def download(self, posts: Iterable, target: str) -> Dict[str, int]:
+        """
+        Download posts into a target directory, skipping the ones in its manifest.
+        :param posts: instaloader.Post iterable
+        :param target: target directory (instaloader target)
+        :return: number of posts downloaded, skipped and failed
+        """
+        os.makedirs(target, exist_ok=True)
+        manifest_path = os.path.join(target, MANIFEST_FILE)
+        done = self._read_manifest(manifest_path)
+        counts = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(self.max_workers * 2)
+
+        with open(manifest_path, 'a') as manifest, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def work(post) -> None:
+                try:
+                    try:
+                        downloaded = self._download_post(post, target)
+                    except Exception as e:  # e.g. OSError writing the files
+                        print(f"Error downloading post {post.shortcode}: {e}")
+                        downloaded = False
+                    with lock:
+                        if downloaded:
+                            manifest.write(post.shortcode + '\n')
+                            manifest.flush()
+                            counts['downloaded'] += 1
+                        else:
+                            counts['failed'] += 1
+                finally:
+                    slots.release()
+
+            for post in posts:
+                if post.shortcode in done:
+                    counts['skipped'] += 1
+                    continue
+                done.add(post.shortcode)
+                slots.acquire()
+                executor.submit(work, post)
+        return counts
+
+    def _download_post(self, post, target: str) -> bool:
+        """ Download a post, retrying after connection errors. Return True if it succeeded """
+        for attempt in range(self.max_retries + 1):
+            self._wait_backoff()
+            try:
+                self._loader.download_post(post, target)
+                return True
+            except instaloader.ConnectionException as e:
+                if attempt == self.max_retries:
+                    print(f"Error downloading post {post.shortcode}: {e}")
+                    return False
+                delay = self.backoff * 2 ** attempt
+                print(f"Error downloading post {post.shortcode}. Retrying in {delay:.0f} seconds...")
+                self._back_off(delay)
+            except instaloader.InstaloaderException as e:
+                print(f"Error downloading post {post.shortcode}: {e}")
+                return False
+        return False
+
+    def _back_off(self, delay: float) -> None:
+        """ Pause the downloads of all the workers for (at least) delay seconds """
+        with self._resume_lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+    def _wait_backoff(self) -> None:
+        """ Wait until the downloads are no longer paused """
+        while True:
+            with self._resume_lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    @staticmethod
+    def _read_manifest(manifest_path: str) -> Set[str]:
+        """ Return the shortcodes in a manifest file """
+        if not os.path.exists(manifest_path):
+            return set()
+        with open(manifest_path) as manifest:
+            return {line.strip() for line in manifest if line.strip()}
@@ -5,24 +5,10 @@ SETUP:
     -SESSION_FILE -> Path to session file. Leave blank in order to log in with user password
     -IGNORE_FILE  -> Path to file with usernames to ignore in Difference followers-followees (optional)
     -MAX_ERRORS   -> Define max number of input errors before exiting the application
-
-OLD CONCURRENT IMPLEMENTATION
-def execution(user_session, likes):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future1 = executor.submit(user_session.get_top_n_posts, likes)
-        future2 = executor.submit(user_session.get_difference_followers_followees)
-        future3 = executor.submit(session_login.download_posts, "2021, 01, 01", "all")
-
-        print(f"Finding Top {likes} liked posts for {session.username}...")
-        for k, v in future1.result().items():
-            print(f"Post url: https://www.instagram.com/p/{k}/    Likes: {v}")
-        print("\n")
-
-        print("Finding people that does not follow you back...")
-        if type(future2.result()) == str:
-            print(future2.result())
-        else:
-            print(*future2.result())
+    -CACHE_FILE   -> Path to SQLite file to cache posts, followers and followees (optional)
+    -CACHE_REFRESH_AGE -> Seconds during which the likes of a post are fetched again on every cache
+                          sync (optional, a week by default)
+    -DOWNLOAD_WORKERS -> Number of concurrent post downloads (optional, 4 by default)
 """
 
 import sys
@@ -40,7 +26,8 @@ def menu() -> int:
           "3- Download posts from your account.\n"
           "4- Download posts from another user account.\n"
           "5- Download posts from hashtag.\n"
-          "6- Close program.")
+          "6- Close program.\n"
+          "7- Get monthly engagement statistics.")
     try:
         if menu_error_counter == constants.MAX_ERRORS:
             print("Error, exiting application...")
@@ -78,7 +65,11 @@ if __name__ == "__main__":
     print("---- Instagram Application to analyze data ----\n")
 
     username = input("Username: ")
-    session = InstagramClient(username, session_file=constants.SESSION_FILE)
+    session = InstagramClient(username, session_file=constants.SESSION_FILE,
+                              cache_file=getattr(constants, 'CACHE_FILE', None),
+                              cache_refresh_age=getattr(constants, 'CACHE_REFRESH_AGE',
+                                                        7 * 24 * 3600),
+                              download_workers=getattr(constants, 'DOWNLOAD_WORKERS', 4))
     session.login()
     print("Login successful.\n")
 
@@ -132,6 +123,14 @@ if __name__ == "__main__":
             session.close_session()
             raise sys.exit(0)
 
+        elif user_choice == 7:
+            print(f"Computing monthly statistics for {session.username}...")
+            analytics = session.get_post_analytics()
+            for month, stats in analytics.monthly_stats():
+                print(f"{month}    Posts: {stats['posts']} (photos: {stats['photos']}, "
+                      f"videos: {stats['videos']})    Likes: {stats['likes']} "
+                      f"(avg: {stats['avg_likes']:.1f})")
+
         else:
             print("Invalid option. Please, try again.")
 
@@ -0,0 +1,204 @@
+"""
+Record and replay of the HTTP responses that instaloader receives from Instagram, so the client
+can be measured offline and deterministically.
+Requests are intercepted at the HTTP layer: a requests adapter is mounted on every session of the
+InstaloaderContext (its session, the anonymous sessions of page data and downloads, and the copies
+of GraphQL queries), and every response is stored as a fixture file named by the hash of its
+method, URL and body. The profile node is stored too, so the client is built without requesting
+the profile page.
+
+Usage examples:
+    loader = instaloader.Instaloader()
+    with Recorder(loader.context, './fixtures') as recorder:
+        profile = instaloader.Profile.from_username(loader.context, username)
+        recorder.save_profile(profile)
+        InstagramClient(username, loader=loader, profile=profile).get_top_liked_posts(10)
+
+    with Replayer(loader.context, './fixtures', latency=0.2, jitter=0.1) as replayer:
+        profile = replayer.load_profile()
+        InstagramClient(username, loader=loader, profile=profile).get_top_liked_posts(10)
+"""
+
+import io
+import os
+import json
+import time
+import base64
+import random
+import hashlib
+import http.client
+import instaloader
+import instaloader.instaloadercontext
+import requests
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Union
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+# File with the profile node, inside the fixture directory
+PROFILE_FILE = 'profile.json'
+
+
+def request_key(method: str, url: str, body: Optional[Union[str, bytes]]) -> str:
+    """ Return the fixture name of a request """
+    if isinstance(body, bytes):
+        body = body.decode(errors='replace')
+    request = json.dumps([method, url, body])
+    return hashlib.sha1(request.encode()).hexdigest()
+
+
+class _RecordedBody(io.BytesIO):
+    """
+    Raw body of a recorded response. It carries the Set-Cookie headers as an http.client response
+    would, so requests.Session stores the cookies of the response.
+    """
+    def __init__(self, body: bytes, cookies: List[str]):
+        super().__init__(body)
+        headers = http.client.HTTPMessage()
+        for cookie in cookies:
+            headers['Set-Cookie'] = cookie
+        self._original_response = SimpleNamespace(msg=headers)
+
+
+class _FixtureAdapter(BaseAdapter):
+    """ requests adapter that sends every request through a session patch """
+    def __init__(self, patch: '_SessionPatch'):
+        super().__init__()
+        self._patch = patch
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        return self._patch.send(request, **kwargs)
+
+    def close(self) -> None:
+        pass  # closed by the patch, not by the sessions it is mounted on
+
+
+class _SessionPatch(ABC):
+    """
+    Context manager that mounts a fixture adapter on the HTTP sessions of an InstaloaderContext
+    while it is active.
+    :param context: instaloader context (Instaloader.context)
+    :param fixture_dir: directory of the fixture files
+    """
+    def __init__(self, context, fixture_dir: str):
+        self._context = context
+        self.fixture_dir = fixture_dir
+        self.requests = 0
+        self._adapter = _FixtureAdapter(self)
+
+    def __enter__(self):
+        self._session = self._context._session
+        self._adapters = self._session.adapters.copy()
+        self._mount(self._session)
+        get_anonymous_session = self._context.get_anonymous_session
+        self._context.get_anonymous_session = lambda: self._mount(get_anonymous_session())
+        self._copy_session = instaloader.instaloadercontext.copy_session
+        instaloader.instaloadercontext.copy_session = \
+            lambda *args, **kwargs: self._mount(self._copy_session(*args, **kwargs))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._session.adapters = self._adapters
+        del self._context.get_anonymous_session  # back to the method of the class
+        instaloader.instaloadercontext.copy_session = self._copy_session
+
+    @abstractmethod
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        """ Answer a request of the patched sessions """
+
+    def _mount(self, session: requests.Session) -> requests.Session:
+        session.mount('https://', self._adapter)
+        session.mount('http://', self._adapter)
+        return session
+
+    def _fixture_path(self, request: requests.PreparedRequest) -> str:
+        key = request_key(request.method, request.url, request.body)
+        return os.path.join(self.fixture_dir, key + '.json')
+
+    def _profile_path(self) -> str:
+        return os.path.join(self.fixture_dir, PROFILE_FILE)
+
+    @staticmethod
+    def _response(request: requests.PreparedRequest, fixture: Dict[str, Any]) -> requests.Response:
+        """ Build the response of a request from its fixture """
+        response = requests.Response()
+        response.status_code = fixture['status']
+        response.reason = fixture['reason']
+        response.headers = CaseInsensitiveDict(fixture['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.raw = _RecordedBody(base64.b64decode(fixture['body']), fixture['cookies'])
+        response.url = request.url
+        response.request = request
+        return response
+
+
+class Recorder(_SessionPatch):
+    """ Send requests to Instagram and store their responses as fixtures """
+    def __init__(self, context, fixture_dir: str):
+        super().__init__(context, fixture_dir)
+        self._http = HTTPAdapter()
+
+    def __enter__(self):
+        os.makedirs(self.fixture_dir, exist_ok=True)
+        return super().__enter__()
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        response = self._http.send(request, **kwargs)
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() != 'content-encoding'}  # the body is stored decoded
+        fixture = {
+            'method': request.method, 'url': request.url, 'status': response.status_code,
+            'reason': response.reason, 'headers': headers,
+            'cookies': response.raw.headers.getlist('Set-Cookie'),
+            'body': base64.b64encode(response.content).decode()
+        }
+        self.requests += 1
+        with open(self._fixture_path(request), 'w') as fixture_file:
+            json.dump(fixture, fixture_file)
+        return self._response(request, fixture)
+
+    def save_profile(self, profile: instaloader.Profile) -> None:
+        """ Store the node of a profile, so replays do not request it """
+        instaloader.save_structure_to_file(profile, self._profile_path())
+
+    def __exit__(self, *exc_info) -> None:
+        super().__exit__(*exc_info)
+        self._http.close()
+        print(f"{self.requests} responses recorded in {self.fixture_dir}")
+
+
+class Replayer(_SessionPatch):
+    """
+    Answer requests with the recorded fixtures, without connecting to Instagram.
+    :param latency: seconds to wait before every response
+    :param jitter: maximum random seconds added to the latency
+    :param seed: random seed of the jitter, so replays are deterministic
+    """
+    def __init__(self, context, fixture_dir: str, latency: float = 0.0, jitter: float = 0.0,
+                 seed: int = 0):
+        super().__init__(context, fixture_dir)
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        fixture_path = self._fixture_path(request)
+        if not os.path.exists(fixture_path):
+            print(f"Error, request to {request.url} was not recorded.")
+            raise FileNotFoundError(fixture_path)
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        self.requests += 1
+        with open(fixture_path) as fixture_file:
+            return self._response(request, json.load(fixture_file))
+
+    def load_profile(self) -> instaloader.Profile:
+        """ Return the recorded profile """
+        profile_path = self._profile_path()
+        if not os.path.exists(profile_path):
+            print(f"Error, the profile was not recorded in {self.fixture_dir}.")
+            raise FileNotFoundError(profile_path)
+        return instaloader.load_structure_from_file(self._context, profile_path)
@@ -0,0 +1,151 @@
+"""
+Date-range scanner of hashtag posts.
+Hashtag feeds are almost sorted by date (newest first), so a scan skips the posts newer than the
+range and stops after a number of posts older than the range (the stop threshold).
+Every hashtag has a local index (JSON file) with:
+    -out_of_order -> the maximum number of older posts seen before a newer post in earlier scans,
+                     used to tune the stop threshold
+    -checkpoints  -> post dates at positions of the feed (frozen instaloader iterators), so a scan
+                     resumes from a position newer than its range (with a margin for posts out
+                     of order) instead of walking the feed again from the newest post
+"""
+
+import os
+import json
+import math
+import instaloader
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+try:
+    from instaloader import FrozenNodeIterator
+except ImportError:  # instaloader < 4.5, iterators are not resumable
+    FrozenNodeIterator = None
+
+
+# File with the index of a hashtag, inside its download directory
+INDEX_FILE = '.hashtag_index.json'
+# Stop threshold before any out-of-order post is observed, and its lower bound afterwards
+DEFAULT_STOP_THRESHOLD = 50
+MIN_STOP_THRESHOLD = 10
+# Multiplier of the observed out-of-order posts
+SAFETY_FACTOR = 2
+# Posts between checkpoints and maximum number of checkpoints per hashtag
+CHECKPOINT_INTERVAL = 48
+MAX_CHECKPOINTS = 100
+
+
+class HashtagScanner:
+    """
+    Scan the posts of a hashtag within a date range, using and updating its local index.
+    :param hashtag: instaloader.Hashtag to scan
+    :param index_dir: directory of the index file
+    """
+    def __init__(self, hashtag: instaloader.Hashtag, index_dir: str):
+        self._hashtag = hashtag
+        self.index_path = os.path.join(index_dir, INDEX_FILE)
+        self.out_of_order: Optional[int] = None
+        self.checkpoints: List[dict] = []  # {'date': isoformat, 'iterator': FrozenNodeIterator}
+        self._load_index()
+
+    @property
+    def stop_threshold(self) -> int:
+        """ Number of posts older than the range to see before stopping a scan """
+        if self.out_of_order is None:
+            return DEFAULT_STOP_THRESHOLD
+        return max(MIN_STOP_THRESHOLD, math.ceil(self.out_of_order * SAFETY_FACTOR))
+
+    def scan(self, start_date: datetime, end_date: datetime) -> Iterator[instaloader.Post]:
+        """
+        Yield the posts published between two dates.
+        :param start_date: initial date (excluded)
+        :param end_date: end date (included)
+        """
+        posts = self._get_posts(end_date)
+        resumable = FrozenNodeIterator is not None and hasattr(posts, 'freeze')
+        stop_threshold = self.stop_threshold
+        older = 0  # posts older than start_date seen so far
+        try:
+            for i, post in enumerate(posts, 1):
+                if resumable and i % CHECKPOINT_INTERVAL == 0:
+                    self._add_checkpoint(post.date, posts.freeze())
+                if post.date <= start_date:
+                    older += 1
+                    if older >= stop_threshold:
+                        break
+                    continue
+                if older:
+                    self.out_of_order = max(self.out_of_order or 0, older)
+                if post.date <= end_date:
+                    yield post
+        finally:
+            self._save_index()
+
+    def _get_posts(self, end_date: datetime) -> Iterator[instaloader.Post]:
+        """
+        Return a post iterator, resumed from a checkpoint newer than end_date.
+        Posts out of order may appear before the oldest of those checkpoints, so the scan resumes
+        as many checkpoints earlier as needed to walk at least stop_threshold posts newer than
+        end_date (and one checkpoint earlier at least).
+        """
+        if not hasattr(self._hashtag, 'get_posts_resumable'):
+            return self._hashtag.get_posts()
+        posts = self._hashtag.get_posts_resumable()
+        now = datetime.now().timestamp()
+        checkpoints = sorted((c for c in self.checkpoints
+                              if c['date'] >= end_date.isoformat()
+                              and (c['iterator'].best_before or 0) >= now),
+                             key=lambda c: c['date'])
+        margin = 1 + math.ceil(self.stop_threshold / CHECKPOINT_INTERVAL)
+        if len(checkpoints) > margin:
+            checkpoint = checkpoints[margin]
+            try:
+                posts.thaw(checkpoint['iterator'])
+                print(f"Resuming hashtag scan from posts of {checkpoint['date']}...")
+            except instaloader.InvalidArgumentException:
+                pass  # e.g. saved by another user, scan from the newest post
+        return posts
+
+    def _add_checkpoint(self, date: datetime, frozen) -> None:
+        """ Add a position of the feed to the index, keeping at most MAX_CHECKPOINTS """
+        self.checkpoints = [c for c in self.checkpoints if c['date'] != date.isoformat()]
+        self.checkpoints.append({'date': date.isoformat(), 'iterator': frozen})
+        if len(self.checkpoints) > MAX_CHECKPOINTS:
+            self.checkpoints.sort(key=lambda c: c['date'])
+            self.checkpoints = self.checkpoints[::2]
+
+    def _load_index(self) -> None:
+        """ Read the index file, if it exists """
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+        except ValueError as e:
+            print(f"Error reading hashtag index {self.index_path}: {e}")
+            return
+        if not isinstance(index, dict):
+            print(f"Error reading hashtag index {self.index_path}: not an object")
+            return
+        out_of_order = index.get('out_of_order')
+        self.out_of_order = out_of_order if isinstance(out_of_order, int) else None
+        if FrozenNodeIterator is not None:
+            try:
+                self.checkpoints = [
+                    {'date': str(c['date']), 'iterator': FrozenNodeIterator(**c['iterator'])}
+                    for c in index.get('checkpoints', [])
+                ]
+            except (KeyError, TypeError) as e:
+                # e.g. written by another instaloader version, scan from the newest post
+                print(f"Ignoring checkpoints of hashtag index {self.index_path}: {e!r}")
+
+    def _save_index(self) -> None:
+        """ Write the index file """
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        index = {
+            'out_of_order': self.out_of_order,
+            'checkpoints': [{'date': c['date'], 'iterator': c['iterator']._asdict()}
+                            for c in self.checkpoints]
+        }
+        with open(self.index_path, 'w') as index_file:
+            json.dump(index, index_file)